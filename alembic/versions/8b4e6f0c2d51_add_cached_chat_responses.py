@@ -0,0 +1,34 @@
+"""add cached chat responses
+
+Revision ID: 8b4e6f0c2d51
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-16 10:03:17.208114
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8b4e6f0c2d51"
+down_revision = "3f1c2a9d7b10"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "cached_chat_responses",
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("response", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+    )
+    op.create_index("ix_cached_chat_responses_expires_at", "cached_chat_responses", ["expires_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_cached_chat_responses_expires_at", table_name="cached_chat_responses")
+    op.drop_table("cached_chat_responses")
@@ -1,9 +1,25 @@
-from fastapi import APIRouter
+import asyncio
+import json
+import time
+
+from fastapi import APIRouter, Header
+from fastapi.responses import StreamingResponse
 import httpx
 from pydantic import BaseModel
-from typing import List
+from starlette.background import BackgroundTask
+from typing import List, Optional
 
 from config import settings
+from exceptions import ChatDemoException
+from utils.chat_cache import chat_cache, payload_hash
+from utils.conversation_store import conversation_store
+from utils.deadline import within_deadline, without_deadline
+from utils.history import history_compactor
+from utils.http_client import get_http_client
+from utils.limiter import AdaptiveLimiter
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.singleflight import SingleFlight
 
 
 # Update the router to include the database session dependency
@@ -17,23 +33,65 @@ class Message(BaseModel):
 
 class ChatRequest(BaseModel):
     messages: List[Message]
+    # When set, `messages` holds only the new messages and the rest of the history is loaded server side
+    conversation_id: Optional[str] = None
 
 
-@router.get("/status")
-async def status() -> dict:
-    return {"status": "ok"}
+class BatchChatRequest(BaseModel):
+    requests: List[ChatRequest]
+
+
+class BatchChatError(BaseModel):
+    status_code: int
+    message: str
+
+
+class BatchChatItem(BaseModel):
+    index: int
+    response: Optional[dict] = None
+    error: Optional[BatchChatError] = None
+
+
+class ConversationResponse(BaseModel):
+    conversation_id: str
+    messages: List[Message] = []
+
 
+# Field of the CHAI API response holding the bot's reply, stored back onto server-side conversations
+UPSTREAM_REPLY_FIELD = "model_output"
 
-@router.post("/chat")
-async def chat(request: ChatRequest) -> dict:
+
+def is_upstream_overload(exc: BaseException) -> bool:
     """
-    Process a chat request with conversation history and forward to CHAI API
+    Whether an upstream failure signals overload, as opposed to e.g. a bad request
     """
-    # Convert our message format to CHAI's format
-    chat_history = [{"sender": msg.sender.capitalize(), "message": msg.message} for msg in request.messages]
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code == 429 or exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+upstream_calls = SingleFlight()
+upstream_limiter = AdaptiveLimiter(
+    limit=settings.UPSTREAM_CONCURRENCY_LIMIT,
+    min_limit=settings.UPSTREAM_CONCURRENCY_MIN,
+    max_limit=settings.UPSTREAM_CONCURRENCY_MAX,
+    max_queue=settings.UPSTREAM_QUEUE_SIZE,
+    queue_timeout=settings.UPSTREAM_QUEUE_TIMEOUT,
+    latency_target=settings.UPSTREAM_LATENCY_TARGET,
+    adaptive=settings.UPSTREAM_ADAPTIVE_LIMIT,
+    is_overload=is_upstream_overload,
+)
+metrics.register_collector("upstream_limiter", upstream_limiter.stats)
+metrics.register_collector("upstream_single_flight", upstream_calls.stats)
 
-    # Prepare the request payload
-    chai_request = {
+
+def build_chai_request(messages: List[dict]) -> dict:
+    """
+    Converts our message format to CHAI's request payload
+    """
+    chat_history = [{"sender": msg["sender"].capitalize(), "message": msg["message"]} for msg in messages]
+
+    return {
         "memory": "I am Bot, and this is my mind.",
         "prompt": "An engaging conversation with Bot.",
         "bot_name": "Bot",
@@ -41,9 +99,273 @@ async def chat(request: ChatRequest) -> dict:
         "chat_history": chat_history,
     }
 
-    # Send request to CHAI API
-    headers = {"Authorization": f"Bearer {settings.API_KEY}"}
-    async with httpx.AsyncClient() as client:
-        response = await client.post(settings.API_URL, json=chai_request, headers=headers)
+
+def get_upstream_headers() -> dict:
+    return {"Authorization": f"Bearer {settings.API_KEY}"}
+
+
+@router.get("/status")
+async def status() -> dict:
+    return {"status": "ok"}
+
+
+@router.get("/cache")
+async def cache_stats() -> dict:
+    return chat_cache.stats()
+
+
+@router.get("/upstream")
+async def upstream_stats() -> dict:
+    return {
+        "limiter": upstream_limiter.stats(),
+        "single_flight": upstream_calls.stats(),
+        "history": history_compactor.stats(),
+    }
+
+
+@router.post("/conversations")
+async def create_conversation() -> ConversationResponse:
+    """
+    Starts a server-side conversation. Pass the returned ID with each chat request to only send new messages.
+    """
+    conversation_id = await conversation_store.create()
+    return ConversationResponse(conversation_id=conversation_id)
+
+
+@router.get("/conversations/{conversation_id}")
+async def get_conversation(conversation_id: str) -> ConversationResponse:
+    messages = await conversation_store.get_history(conversation_id)
+    return ConversationResponse(conversation_id=conversation_id, messages=messages)
+
+
+@router.post("/chat", response_model=None)
+async def chat(
+    request: ChatRequest, stream: bool = False, cache_control: Optional[str] = Header(None)
+) -> dict | StreamingResponse:
+    """
+    Process a chat request with conversation history and forward to CHAI API.
+
+    With `?stream=true` the upstream body is relayed to the client as it arrives instead of being buffered.
+    With a `conversation_id`, the stored history is sent followed by the new messages, trimmed to the most recent
+    messages that fit the history budget (this applies to stateless requests too). The new messages are stored with
+    the reply once upstream has answered, so a failed request can be retried without duplicating them.
+    Responses to identical payloads are served from cache unless the request sends `Cache-Control: no-cache`.
+    """
+    chai_request = await prepare_chai_request(request)
+
+    if stream:
+        return await stream_chat(request, chai_request)
+
+    return await complete_chat(request, chai_request, use_cache="no-cache" not in (cache_control or ""))
+
+
+@router.post("/batch", response_model=None)
+async def batch(
+    request: BatchChatRequest, stream: bool = False, cache_control: Optional[str] = Header(None)
+) -> List[BatchChatItem] | StreamingResponse:
+    """
+    Process many independent chat requests in one round trip.
+
+    Items are sent upstream concurrently, at most CHAT_BATCH_CONCURRENCY at a time, and results come back in input
+    order with per-item errors. With `?stream=true` results are written as NDJSON lines as each item completes.
+    """
+    if len(request.requests) > settings.CHAT_BATCH_MAX_SIZE:
+        raise ChatDemoException(f"Batches are limited to {settings.CHAT_BATCH_MAX_SIZE} requests", status_code=413)
+
+    semaphore = asyncio.Semaphore(settings.CHAT_BATCH_CONCURRENCY)
+    use_cache = "no-cache" not in (cache_control or "")
+
+    async def run_item(index: int, item: ChatRequest) -> BatchChatItem:
+        async with semaphore:
+            try:
+                chai_request = await prepare_chai_request(item)
+                response = await complete_chat(item, chai_request, use_cache=use_cache)
+            except ChatDemoException as e:
+                return BatchChatItem(index=index, error=BatchChatError(status_code=e.status_code, message=e.message))
+            except httpx.HTTPStatusError as e:
+                error = BatchChatError(status_code=e.response.status_code, message="Upstream error")
+                return BatchChatItem(index=index, error=error)
+            except Exception as e:
+                logger.exception(f"Error processing batch item {index}: {str(e)}")
+                return BatchChatItem(index=index, error=BatchChatError(status_code=500, message="Backend error"))
+        return BatchChatItem(index=index, response=response)
+
+    if not stream:
+        return list(await asyncio.gather(*(run_item(index, item) for index, item in enumerate(request.requests))))
+
+    async def results():
+        tasks = [asyncio.ensure_future(run_item(index, item)) for index, item in enumerate(request.requests)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                yield item.model_dump_json(exclude_none=True) + "\n"
+        finally:
+            # Stop outstanding upstream calls if the client disconnects
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson", headers={"Content-Encoding": "identity"})
+
+
+async def prepare_chai_request(request: ChatRequest) -> dict:
+    """
+    Builds the upstream payload for a chat request, loading and compacting the conversation history
+    """
+    messages = [msg.model_dump() for msg in request.messages]
+    if request.conversation_id:
+        # The new messages are only stored along with the reply, see `save_turn`
+        messages = await conversation_store.get_history(request.conversation_id) + messages
+
+    # Bound the size of what we send upstream for very long conversations
+    messages = history_compactor.compact(messages)
+    return build_chai_request(messages)
+
+
+async def complete_chat(request: ChatRequest, chai_request: dict, use_cache: bool = True) -> dict:
+    """
+    Gets the upstream response for a prepared payload and stores the reply on the conversation, if any
+    """
+    cache_key = payload_hash(chai_request)
+    result = None
+    if use_cache:
+        result = await chat_cache.get(cache_key)
+
+    if result is None:
+        # Identical payloads already in flight share a single upstream call. It runs without the deadline of the
+        # request that started it: each caller waits for it as long as its own deadline allows, and it is cancelled
+        # once nobody is waiting, so it lives as long as the widest of their deadlines.
+        result = await within_deadline(
+            upstream_calls.do(cache_key, lambda: without_deadline(fetch_chat_response(cache_key, chai_request))),
+            "upstream request",
+        )
+
+    if request.conversation_id:
+        reply = result.get(UPSTREAM_REPLY_FIELD) if isinstance(result, dict) else None
+        await save_turn(request, chai_request, reply if isinstance(reply, str) else None)
+
+    return result
+
+
+async def save_turn(request: ChatRequest, chai_request: dict, reply: Optional[str]):
+    """
+    Appends the request's new messages and the bot's reply to its conversation in one go. Only called once upstream
+    has answered, so a failed call leaves nothing behind for a retry to duplicate.
+    """
+    messages = [msg.model_dump() for msg in request.messages]
+    if reply is not None:
+        messages.append({"sender": chai_request["bot_name"], "message": reply})
+    await conversation_store.append(request.conversation_id, messages)
+
+
+def stream_reply(body: bytes) -> str:
+    """
+    The bot's reply in a relayed response body: its reply field if upstream answered with JSON, else the whole body
+    """
+    try:
+        parsed = json.loads(body)
+    except ValueError:
+        parsed = None
+    reply = parsed.get(UPSTREAM_REPLY_FIELD) if isinstance(parsed, dict) else None
+    return reply if isinstance(reply, str) else body.decode("utf-8", errors="replace")
+
+
+async def fetch_chat_response(cache_key: str, chai_request: dict) -> dict:
+    """
+    Sends the request to CHAI API and caches the response. Its callers bound it by their deadlines.
+    """
+    async with upstream_limiter.slot():
+        client = get_http_client()
+        with metrics.timer("upstream"):
+            response = await client.post(settings.API_URL, json=chai_request, headers=get_upstream_headers())
         response.raise_for_status()
-        return response.json()
+        result = response.json()
+    await chat_cache.set(cache_key, result)
+    return result
+
+
+async def stream_chat(request: ChatRequest, chai_request: dict) -> StreamingResponse:
+    """
+    Opens a streaming request to CHAI API and relays the body chunk by chunk.
+
+    Each chunk is only read from upstream once the previous one has been handed to the ASGI server, so a slow client
+    applies backpressure all the way to the upstream connection. If the client disconnects, Starlette cancels the
+    relay and the upstream response is closed, which aborts the upstream request.
+
+    The request holds an upstream slot until the stream ends, but only the time to the upstream response headers
+    is fed back to the limiter, since total duration depends on the generation length.
+
+    With a `conversation_id`, the relayed body is also collected so that the turn can be stored once the stream has
+    been relayed in full.
+
+    Every chunk is awaited within the request's deadline. If it passes mid-stream the relay is aborted, which closes
+    the upstream response and frees the slot, rather than outliving the invocation.
+    """
+    # Waiting for a slot counts against the deadline too. acquire() hands the slot back if it is cancelled
+    await within_deadline(upstream_limiter.acquire(), "upstream request")
+    started = time.monotonic()
+    try:
+        client = get_http_client()
+        upstream_request = client.build_request(
+            "POST", settings.API_URL, json=chai_request, headers=get_upstream_headers()
+        )
+        # Only the time to the response headers, as for the limiter
+        with metrics.timer("upstream"):
+            response = await within_deadline(client.send(upstream_request, stream=True), "upstream request")
+
+        if response.is_error:
+            await response.aread()
+            await response.aclose()
+            response.raise_for_status()
+    except BaseException as e:
+        if isinstance(e, Exception):
+            upstream_limiter.record(time.monotonic() - started, overloaded=is_upstream_overload(e))
+        upstream_limiter.release()
+        raise
+    upstream_limiter.record(time.monotonic() - started)
+
+    released = False
+
+    async def close():
+        nonlocal released
+        await response.aclose()
+        if not released:
+            released = True
+            upstream_limiter.release()
+
+    async def relay():
+        body = bytearray() if request.conversation_id else None
+        chunks = response.aiter_bytes()
+        try:
+            while True:
+                try:
+                    chunk = await within_deadline(chunks.__anext__(), "upstream stream")
+                except StopAsyncIteration:
+                    break
+                if body is not None:
+                    body += chunk
+                yield chunk
+        finally:
+            await close()
+
+        # Only reached if the whole body was relayed
+        if body is not None:
+            try:
+                await save_turn(request, chai_request, stream_reply(bytes(body)))
+            except Exception as e:
+                # The response has already been sent, so this can only be logged
+                logger.error(f"Error saving streamed reply to conversation {request.conversation_id}: {str(e)}")
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        # GZipMiddleware passes responses that already declare an encoding through untouched. Without this it would
+        # hold chunks in its compressor and defeat streaming.
+        "Content-Encoding": "identity",
+    }
+    return StreamingResponse(
+        relay(),
+        status_code=response.status_code,
+        media_type=response.headers.get("content-type", "application/octet-stream"),
+        headers=headers,
+        background=BackgroundTask(close),
+    )
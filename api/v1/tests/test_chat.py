@@ -0,0 +1,283 @@
+"""
+Tests for the chat proxy routes. The upstream CHAI API is replaced with an httpx mock transport.
+"""
+
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from api.v1.chat import upstream_limiter
+from app import app
+from utils import http_client
+from utils.chat_cache import chat_cache
+from utils.conversation_store import conversation_store
+from utils.test_utils import BaseTestCase
+
+
+class MockUpstream:
+    @pytest.fixture(autouse=True)
+    def upstream(self, monkeypatch):
+        self.upstream_requests = []
+        self.upstream_stream = None
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.upstream_requests.append(request)
+            if b"fail" in request.content:
+                return httpx.Response(500, json={"error": "boom"})
+            if self.upstream_stream is not None:
+                return httpx.Response(200, content=self.upstream_stream, headers={"content-type": "text/event-stream"})
+            return httpx.Response(200, json={"model_output": "Hi there"})
+
+        monkeypatch.setattr(
+            http_client, "build_http_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        )
+        http_client.client = None
+        chat_cache.clear()
+        yield
+        http_client.client = None
+
+
+class TestChat(MockUpstream):
+    def test_chat(self):
+        with TestClient(app) as client:
+            response = client.post("/api/v1/chat/chat", json={"messages": [{"sender": "user", "message": "Hello"}]})
+        assert response.status_code == 200
+        assert response.json() == {"model_output": "Hi there"}
+        assert len(self.upstream_requests) == 1
+
+    def test_chat_reuses_upstream_client(self):
+        with TestClient(app) as client:
+            client.post("/api/v1/chat/chat", json={"messages": [{"sender": "user", "message": "Hello"}]})
+            first = http_client.client
+            client.post("/api/v1/chat/chat", json={"messages": [{"sender": "user", "message": "Again"}]})
+            assert http_client.client is first
+        # closed by the app lifespan on shutdown
+        assert http_client.client is None
+
+    def test_chat_cached(self):
+        payload = {"messages": [{"sender": "user", "message": "Hello"}]}
+        with TestClient(app) as client:
+            assert client.post("/api/v1/chat/chat", json=payload).json() == {"model_output": "Hi there"}
+            assert client.post("/api/v1/chat/chat", json=payload).json() == {"model_output": "Hi there"}
+            assert len(self.upstream_requests) == 1
+
+            # "regenerate" bypasses the cache
+            client.post("/api/v1/chat/chat", json=payload, headers={"Cache-Control": "no-cache"})
+            assert len(self.upstream_requests) == 2
+
+            stats = client.get("/api/v1/chat/cache").json()
+        assert stats["local"]["hits"] == 1
+
+    def test_chat_cache_disabled(self, monkeypatch):
+        monkeypatch.setattr(chat_cache, "enabled", False)
+        payload = {"messages": [{"sender": "user", "message": "Hello"}]}
+        with TestClient(app) as client:
+            client.post("/api/v1/chat/chat", json=payload)
+            client.post("/api/v1/chat/chat", json=payload)
+        assert len(self.upstream_requests) == 2
+
+    def test_batch(self):
+        messages = ["one", "fail", "three"]
+        payload = {"requests": [{"messages": [{"sender": "user", "message": message}]} for message in messages]}
+        with TestClient(app) as client:
+            response = client.post("/api/v1/chat/batch", json=payload)
+
+        assert response.status_code == 200
+        items = response.json()
+        assert [item["index"] for item in items] == [0, 1, 2]
+        assert items[0]["response"] == {"model_output": "Hi there"}
+        assert items[1]["error"] == {"status_code": 500, "message": "Upstream error"}
+        assert items[2]["response"] == {"model_output": "Hi there"}
+
+    def test_batch_stream(self):
+        payload = {"requests": [{"messages": [{"sender": "user", "message": str(i)}]} for i in range(5)]}
+        with TestClient(app) as client:
+            response = client.post("/api/v1/chat/batch?stream=true", json=payload)
+
+        assert response.headers["content-type"] == "application/x-ndjson"
+        items = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(item["index"] for item in items) == [0, 1, 2, 3, 4]
+        assert all(item["response"] == {"model_output": "Hi there"} for item in items)
+
+    def test_chat_stream(self):
+        events = [f"data: token {i}\n\n".encode() for i in range(200)]
+
+        async def upstream_stream():
+            for event in events:
+                yield event
+
+        self.upstream_stream = upstream_stream()
+        with TestClient(app) as client:
+            with client.stream(
+                "POST",
+                "/api/v1/chat/chat?stream=true",
+                json={"messages": [{"sender": "user", "message": "Hello"}]},
+                headers={"Accept-Encoding": "gzip"},
+            ) as response:
+                assert response.status_code == 200
+                assert response.headers["content-type"].startswith("text/event-stream")
+                assert response.headers.get("content-encoding") != "gzip"
+                assert response.read() == b"".join(events)
+
+
+class TestChatConversation(BaseTestCase, MockUpstream):
+    def test_chat_with_conversation(self):
+        conversation_store.clear_cache()
+        with TestClient(app) as client:
+            conversation_id = client.post("/api/v1/chat/conversations").json()["conversation_id"]
+
+            for text in ("Hello", "How are you?"):
+                response = client.post(
+                    "/api/v1/chat/chat",
+                    json={"conversation_id": conversation_id, "messages": [{"sender": "user", "message": text}]},
+                )
+                assert response.status_code == 200
+
+            response = client.get(f"/api/v1/chat/conversations/{conversation_id}")
+
+        # the second upstream call carries the whole history, including the stored bot reply
+        assert json.loads(self.upstream_requests[-1].content)["chat_history"] == [
+            {"sender": "User", "message": "Hello"},
+            {"sender": "Bot", "message": "Hi there"},
+            {"sender": "User", "message": "How are you?"},
+        ]
+        assert len(response.json()["messages"]) == 4
+
+    def test_failed_chat_is_not_stored(self):
+        conversation_store.clear_cache()
+        with TestClient(app, raise_server_exceptions=False) as client:
+            conversation_id = client.post("/api/v1/chat/conversations").json()["conversation_id"]
+            response = client.post(
+                "/api/v1/chat/chat",
+                json={"conversation_id": conversation_id, "messages": [{"sender": "user", "message": "fail"}]},
+            )
+            assert response.status_code == 500
+
+            history = client.get(f"/api/v1/chat/conversations/{conversation_id}").json()["messages"]
+        assert history == []
+
+    def test_chat_stream_with_conversation(self):
+        conversation_store.clear_cache()
+        self.upstream_stream = b'{"model_output": "Streamed reply"}'
+        with TestClient(app) as client:
+            conversation_id = client.post("/api/v1/chat/conversations").json()["conversation_id"]
+            response = client.post(
+                "/api/v1/chat/chat?stream=true",
+                json={"conversation_id": conversation_id, "messages": [{"sender": "user", "message": "Hello"}]},
+            )
+            assert response.status_code == 200
+
+            history = client.get(f"/api/v1/chat/conversations/{conversation_id}").json()["messages"]
+        assert history == [{"sender": "user", "message": "Hello"}, {"sender": "Bot", "message": "Streamed reply"}]
+
+    def test_chat_with_unknown_conversation(self):
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/chat/chat",
+                json={"conversation_id": "does-not-exist", "messages": [{"sender": "user", "message": "Hello"}]},
+            )
+        assert response.status_code == 404
+        assert self.upstream_requests == []
+
+
+class TestChatDeadline:
+    @pytest.fixture(autouse=True)
+    def slow_upstream(self, monkeypatch):
+        self.upstream_requests = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            self.upstream_requests.append(request)
+            await asyncio.sleep(2)
+            return httpx.Response(200, json={"model_output": "Too late"})
+
+        monkeypatch.setattr(
+            http_client, "build_http_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        )
+        http_client.client = None
+        chat_cache.clear()
+        yield
+        http_client.client = None
+
+    def test_slow_upstream_times_out(self):
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/chat/chat",
+                json={"messages": [{"sender": "user", "message": "Hello"}]},
+                headers={"X-Request-Timeout": "1.8"},
+            )
+        assert response.status_code == 504
+        assert len(self.upstream_requests) == 1
+
+    def test_too_little_time_fails_fast(self):
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/chat/chat",
+                json={"messages": [{"sender": "user", "message": "Hello"}]},
+                headers={"X-Request-Timeout": "1.2"},
+            )
+        assert response.status_code == 504
+        assert self.upstream_requests == []
+
+    def test_coalesced_callers_keep_their_own_deadline(self):
+        payload = {"messages": [{"sender": "user", "message": "Hello"}]}
+
+        async def main():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                short = asyncio.ensure_future(
+                    client.post("/api/v1/chat/chat", json=payload, headers={"X-Request-Timeout": "1.8"})
+                )
+                await asyncio.sleep(0.05)
+                # Joins the call started by the request above, but has time to wait for it
+                long = asyncio.ensure_future(
+                    client.post("/api/v1/chat/chat", json=payload, headers={"X-Request-Timeout": "10"})
+                )
+                return await short, await long
+
+        short, long = asyncio.run(main())
+        assert short.status_code == 504
+        assert long.status_code == 200
+        assert long.json() == {"model_output": "Too late"}
+        assert len(self.upstream_requests) == 1
+
+    def test_slow_stream_is_cut_off(self, monkeypatch):
+        async def slow_stream():
+            yield b"data: first\n\n"
+            await asyncio.sleep(2)
+            yield b"data: too late\n\n"
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, content=slow_stream(), headers={"content-type": "text/event-stream"})
+
+        monkeypatch.setattr(
+            http_client, "build_http_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        )
+        started = time.monotonic()
+        with TestClient(app, raise_server_exceptions=False) as client:
+            response = client.post(
+                "/api/v1/chat/chat?stream=true",
+                json={"messages": [{"sender": "user", "message": "Hello"}]},
+                headers={"X-Request-Timeout": "1.8"},
+            )
+        assert time.monotonic() - started < 1.5
+        assert b"too late" not in response.content
+        assert upstream_limiter.stats()["in_flight"] == 0
+
+    def test_stream_waiting_for_a_slot_times_out(self, monkeypatch):
+        # Every slot is taken, and the queue would hold the request past its deadline
+        monkeypatch.setattr(upstream_limiter, "in_flight", upstream_limiter.max_limit)
+        monkeypatch.setattr(upstream_limiter, "queue_timeout", 4)
+        started = time.monotonic()
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/chat/chat?stream=true",
+                json={"messages": [{"sender": "user", "message": "Hello"}]},
+                headers={"X-Request-Timeout": "1.8"},
+            )
+        assert response.status_code == 504
+        assert time.monotonic() - started < 2
+        assert self.upstream_requests == []
+        assert upstream_limiter.queue_depth == 0
@@ -5,34 +5,50 @@ try:
 except ImportError:
     pass
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse
 from mangum import Mangum
 
 
-from database import init_engine
 from exceptions import ChatDemoException
 from config import settings
 from api.v1 import chat
-from utils.logger import logger
+from utils.deadline import DeadlineMiddleware
+from utils.http_client import close_http_client
+from utils.logger import flush_logs, logger
+from utils.metrics import MetricsMiddleware, metrics
+from utils.secrets_cache import secrets_cache
+from utils.warmup import handle_warmup_event, is_warmup_event
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # The upstream client is created lazily on first use. Under Mangum lifespan is "off", so it stays open for the
+    # life of the container and warm invocations reuse its connections; under uvicorn it is closed on shutdown.
+    await close_http_client()
 
 
 def create_app():
     logger.info("Initializing FastAPI app")
 
-    # Always initialize the database engine
+    # The database engines are created on first use (see database.get_engine), so requests that never touch the
+    # database don't pay for them on a cold start
     if not settings.SQLALCHEMY_DATABASE_URI:
         raise ValueError("SQLALCHEMY_DATABASE_URI must be set")
 
-    logger.info(f"Initializing database engine with URI: {settings.SQLALCHEMY_DATABASE_URI}")
-    init_engine()
-    logger.info("Database engine initialized")
+    if settings.SECRETS_PRELOAD:
+        loaded = secrets_cache.preload(settings.SECRETS_PRELOAD, region_name=settings.REGION)
+        logger.info("Preloaded %d of %d secrets", loaded, len(settings.SECRETS_PRELOAD))
 
     logger.info("Creating FastAPI app")
     app = FastAPI(
         root_path=settings.ROOT_PATH if not settings.CUSTOM_DOMAIN else None,
+        lifespan=lifespan,
     )
 
     logger.info("Adding middleware")
@@ -49,6 +65,12 @@ def create_app():
     # (https://fastapi.tiangolo.com/advanced/middleware/#gzipmiddleware)
     app.add_middleware(GZipMiddleware, minimum_size=1000)
 
+    # Outside the others, so the deadline covers everything else. It comes from the Lambda context when there is one.
+    app.add_middleware(DeadlineMiddleware)
+
+    if settings.METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware)
+
     logger.info("Including routers")
     app.include_router(chat.router)
 
@@ -60,9 +82,13 @@ def create_app():
     async def status():
         return {"status": "ok"}
 
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
     @app.exception_handler(ChatDemoException)
     async def app_exception_handler(req, exc: ChatDemoException):
-        return JSONResponse(status_code=exc.status_code, content=dict(message=exc.message))
+        return JSONResponse(status_code=exc.status_code, content=dict(message=exc.message), headers=exc.headers)
 
     return app
 
@@ -72,5 +98,15 @@ handler = Mangum(app, lifespan="off")
 
 
 def lambda_handler(event, context):
-    logger.info("Lambda handler called")
-    return handler(event, context)
+    try:
+        # serverless-plugin-warmup pings aren't HTTP events, so answer them here instead of going through Mangum
+        if is_warmup_event(event):
+            return handle_warmup_event()
+
+        logger.debug("Lambda handler called")
+        return handler(event, context)
+    finally:
+        if settings.METRICS_ENABLED:
+            metrics.emit_emf()
+        # Log records are written by a background thread, which won't run while the container is frozen
+        flush_logs()
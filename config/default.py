@@ -1,7 +1,7 @@
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 import os
-from typing import List
+from typing import Dict, List
 
 load_dotenv()
 
@@ -13,16 +13,125 @@ class Default(BaseSettings):
 
     ENV: str = ""
     REGION: str = "us-east-1"
+
+    # Logging. Records go through a queue to a background writer thread unless LOG_QUEUE is off. LOG_LEVELS sets
+    # per-logger levels, e.g. {"botocore": "WARNING"}, and LOG_SAMPLING keeps a fraction of the records below WARNING
+    # per logger. httpx logs every upstream request at INFO, so only a sample of those is kept by default.
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"  # "text" or "json"
+    LOG_QUEUE: bool = True
+    LOG_LEVELS: Dict[str, str] = {}
+    LOG_SAMPLING: Dict[str, float] = {"httpx": 0.1}
     SQLALCHEMY_DATABASE_URI: str = ""
+
+    # Database connection pooling. Profiles: "null" (no pooling, e.g. behind RDS Proxy), "lambda" (a tiny pre-pinged
+    # pool per container), "server" (a sized pool for uvicorn), or "auto" to pick lambda/server from the environment.
+    DB_POOL_PROFILE: str = "auto"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 1800  # seconds
+    DB_POOL_PRE_PING: bool = False
+    DB_POOL_TIMEOUT: float = 30.0  # seconds to wait for a connection from the pool
+    DB_LAMBDA_POOL_SIZE: int = 1
+    DB_LAMBDA_MAX_OVERFLOW: int = 1
+    DB_LAMBDA_POOL_RECYCLE: int = 300
     CUSTOM_DOMAIN: str = ""
     ROOT_PATH: str = ""
     AWS_PROFILE: str | None = None
+    # Shared boto3 clients
+    AWS_MAX_POOL_CONNECTIONS: int = 50
+    AWS_CONNECT_TIMEOUT: float = 5.0
+    AWS_READ_TIMEOUT: float = 60.0
+    AWS_MAX_ATTEMPTS: int = 3
+
+    # S3 transfers
+    S3_MULTIPART_THRESHOLD: int = 16 * 1024 * 1024
+    S3_MULTIPART_CHUNKSIZE: int = 16 * 1024 * 1024
+    S3_MAX_CONCURRENCY: int = 8
+    S3_BATCH_MAX_WORKERS: int = 16  # keep at or below AWS_MAX_POOL_CONNECTIONS
+    S3_SIGNED_URL_CACHE_SIZE: int = 4096
+    S3_SIGNED_URL_SAFETY_MARGIN: int = 30  # seconds of validity a reused presigned URL must have left
+    S3_MULTIPART_URL_EXPIRATION: int = 3600  # seconds
+    S3_STALE_UPLOAD_AGE: int = 24 * 3600  # seconds after which unfinished multipart uploads are aborted
+    # Zip archives are uploaded as they are compressed; memory use is about (concurrency + 1) * part size
+    S3_ARCHIVE_PART_SIZE: int = 8 * 1024 * 1024
+    S3_ARCHIVE_MAX_CONCURRENCY: int = 4
+
+    # Secrets Manager cache. Values older than the TTL are served for up to SECRETS_STALE_TTL more seconds while they
+    # are refreshed in the background.
+    SECRETS_CACHE_TTL: int = 300  # seconds
+    SECRETS_STALE_TTL: int = 3600  # seconds
+    SECRETS_PRELOAD: List[str] = []  # secret names fetched at container start
+    SECRETS_PRELOAD_CONCURRENCY: int = 8
+
+    # Request deadlines. Under Lambda the deadline is the invocation's remaining time; REQUEST_TIMEOUT (seconds, 0 for
+    # none) and the X-Request-Timeout header can shorten it. Calls that can't get DEADLINE_MIN_BUDGET seconds fail
+    # with a 504.
+    REQUEST_TIMEOUT: float = 0
+    DEADLINE_SAFETY_MARGIN: float = 1.0  # seconds kept back to send the response
+    DEADLINE_MIN_BUDGET: float = 0.5
+
+    # Background jobs (manage.py worker). A job whose worker misses heartbeats for JOB_LEASE_SECONDS is claimed again.
+    JOB_CONCURRENCY: int = 4
+    JOB_BATCH_SIZE: int = 4
+    JOB_POLL_INTERVAL: float = 2.0  # seconds between claims when idle
+    JOB_LEASE_SECONDS: int = 120
+    JOB_HEARTBEAT_INTERVAL: float = 30.0  # seconds
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF: int = 30  # seconds before the first retry, doubling on each attempt
+
+    # Metrics, served at /metrics and, under Lambda, written as embedded metric format log lines
+    METRICS_ENABLED: bool = True
+    METRICS_NAMESPACE: str = "ChatDemoServer"
+    METRICS_EMF_INTERVAL: int = 60  # seconds
+
+    # Connections opened on serverless-plugin-warmup pings
+    WARMUP_PRIME_DATABASE: bool = True
+    WARMUP_PRIME_UPSTREAM: bool = True
+    WARMUP_AWS_CLIENTS: List[str] = ["s3", "secretsmanager:us-east-1"]  # "service" or "service:region"
     ADMIN_EMAILS: List[str] = []
 
     API_KEY: str = os.environ["API_KEY"]
     API_URL: str = os.environ["API_URL"]
 
     CACHE_DISABLED: bool = False
+    CHAT_CACHE_TTL: int = 3600  # seconds
+    CHAT_CACHE_MAX_ENTRIES: int = 1024
+    CHAT_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    CHAT_CACHE_SHARED: bool = False  # also cache responses in Postgres, shared by all containers
+
+    # Upstream chat API connection pool (shared across requests and warm Lambda invocations)
+    UPSTREAM_MAX_CONNECTIONS: int = 100
+    UPSTREAM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    UPSTREAM_KEEPALIVE_EXPIRY: float = 60.0
+    UPSTREAM_HTTP2: bool = False  # requires the optional `h2` package
+    UPSTREAM_CONNECT_TIMEOUT: float = 5.0
+    UPSTREAM_READ_TIMEOUT: float = 60.0
+    UPSTREAM_WRITE_TIMEOUT: float = 10.0
+    UPSTREAM_POOL_TIMEOUT: float = 5.0
+
+    # Admission control for upstream chat calls. The in-flight limit adapts between MIN and MAX (AIMD) based on
+    # upstream latency and overload errors, unless UPSTREAM_ADAPTIVE_LIMIT is off.
+    UPSTREAM_CONCURRENCY_LIMIT: int = 20
+    UPSTREAM_CONCURRENCY_MIN: int = 2
+    UPSTREAM_CONCURRENCY_MAX: int = 100
+    UPSTREAM_ADAPTIVE_LIMIT: bool = True
+    UPSTREAM_LATENCY_TARGET: float = 15.0  # seconds, slower calls shrink the limit
+    UPSTREAM_QUEUE_SIZE: int = 100
+    UPSTREAM_QUEUE_TIMEOUT: float = 10.0  # seconds a request may wait for a slot
+
+    # Chat history sent upstream is trimmed to the most recent messages that fit these budgets (0 disables a budget).
+    # Tokens are estimated from characters.
+    CHAT_HISTORY_MAX_CHARS: int = 32000
+    CHAT_HISTORY_MAX_TOKENS: int = 0
+    CHAT_HISTORY_MAX_MESSAGES: int = 0
+
+    # Batch chat endpoint
+    CHAT_BATCH_MAX_SIZE: int = 1000
+    CHAT_BATCH_CONCURRENCY: int = 16
+
+    # Number of conversation histories kept in memory in front of the database
+    CONVERSATION_CACHE_SIZE: int = 1000
 
     # VPC Configuration
     VPC_SECURITY_GROUP_IDS: List[str] = os.environ["VPC_SECURITY_GROUP_IDS"]
@@ -1,13 +1,36 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
-from contextlib import contextmanager
+import asyncio
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from contextlib import asynccontextmanager, contextmanager
 
 from config import settings
+from utils.deadline import apply_statement_timeout
+from utils.db_pool import PoolStats, get_engine_options, get_pool_profile, instrument_engine
 from utils.logger import logger
+from utils.metrics import metrics
 
 engine = None
 SessionLocal = None
 
+async_engine = None
+AsyncSessionLocal = None
+_async_engine_loop = None
+# Engines are created on first use rather than at import, so a cold start only pays for the drivers it needs
+_init_lock = threading.Lock()
+
+sync_pool_stats = PoolStats("sync")
+async_pool_stats = PoolStats("async")
+
+# Async driver to use for each sync driver we might be configured with
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
 
 def get_connection_string():
     connection_string = settings.SQLALCHEMY_DATABASE_URI
@@ -16,41 +39,134 @@ def get_connection_string():
     return connection_string
 
 
+def get_async_connection_string():
+    url = make_url(get_connection_string())
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+    # asyncpg takes `ssl` rather than libpq's `sslmode`
+    if url.drivername == "postgresql+asyncpg" and "sslmode" in url.query:
+        sslmode = url.query["sslmode"]
+        url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": sslmode})
+    return url
+
+
 Base = declarative_base()
 
+# Bound every transaction (sync sessions, and the sync sessions behind async ones) by the request's deadline
+event.listen(Session, "after_begin", apply_statement_timeout)
+
 
-def init_engine():
+def init_engine(with_async: bool = True):
     uri = get_connection_string()
-    logger.info(f"Initializing engine: {uri}")
+    logger.info("Initializing engine: %s", make_url(uri).render_as_string(hide_password=True))
 
     global engine, SessionLocal
-    engine = create_engine(uri)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    logger.info("Using database pool profile: %s", get_pool_profile())
+    new_engine = create_engine(uri, **get_engine_options(uri, sync_pool_stats))
+    instrument_engine(new_engine, sync_pool_stats)
+    # get_engine() checks `engine` without the lock, so only publish it once everything else is in place
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=new_engine)
+    engine = new_engine
+    if with_async:
+        init_async_engine()
     return engine
 
 
+def init_async_engine():
+    global async_engine, AsyncSessionLocal, _async_engine_loop
+    uri = get_async_connection_string()
+    new_engine = create_async_engine(uri, **get_engine_options(uri, async_pool_stats, is_async=True))
+    instrument_engine(new_engine.sync_engine, async_pool_stats)
+    # Don't expire on commit, since reloading expired attributes would need implicit (and unsupported) async IO
+    AsyncSessionLocal = async_sessionmaker(new_engine, autoflush=False, expire_on_commit=False)
+    _async_engine_loop = None
+    # Published last, as for the sync engine
+    async_engine = new_engine
+    return async_engine
+
+
+def get_engine():
+    if engine is None:
+        with _init_lock:
+            if engine is None:
+                init_engine(with_async=False)
+    return engine
+
+
+def get_async_engine():
+    if async_engine is None:
+        with _init_lock:
+            if async_engine is None:
+                init_async_engine()
+    return async_engine
+
+
+def get_pool_stats() -> dict:
+    return {"sync": sync_pool_stats.stats(), "async": async_pool_stats.stats()}
+
+
+metrics.register_collector("db_pool", get_pool_stats)
+
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
 
 
 def drop_db():
-    Base.metadata.drop_all(bind=engine)
+    Base.metadata.drop_all(bind=get_engine())
 
 
 @contextmanager
 def session_scope():
+    get_engine()
     session = SessionLocal()
     try:
-        yield session
+        with metrics.timer("db"):
+            yield session
     except Exception as e:
         logger.info("Rolling back session due to error")
         session.rollback()
         raise e
     finally:
-        logger.info("Closing session")
+        logger.debug("Closing session")
         session.close()
 
 
 def get_db():
     with session_scope() as session:
         yield session
+
+
+def _check_async_engine_loop():
+    """
+    Pooled async connections belong to the event loop that opened them. If we are now on another loop (e.g. the test
+    client started a new one) the old pool is dropped without touching its connections.
+    """
+    global _async_engine_loop
+
+    get_async_engine()
+    loop = asyncio.get_running_loop()
+    if _async_engine_loop is not None and _async_engine_loop is not loop:
+        async_engine.sync_engine.dispose(close=False)
+    _async_engine_loop = loop
+
+
+@asynccontextmanager
+async def async_session_scope():
+    _check_async_engine_loop()
+    session: AsyncSession = AsyncSessionLocal()
+    try:
+        with metrics.timer("db"):
+            yield session
+    except Exception as e:
+        logger.info("Rolling back session due to error")
+        await session.rollback()
+        raise e
+    finally:
+        logger.debug("Closing session")
+        await session.close()
+
+
+async def get_async_db():
+    async with async_session_scope() as session:
+        yield session
@@ -2,6 +2,7 @@ class ChatDemoException(Exception):
     default_message = "Backend error"
     default_status_code = 400
 
-    def __init__(self, message=None, status_code=None):
+    def __init__(self, message=None, status_code=None, headers=None):
         self.message = message or self.default_message
         self.status_code = status_code or self.default_status_code
+        self.headers = headers
@@ -1,9 +1,12 @@
+import argparse
 import os
+import signal
 import sys
 from database import init_db
 
 import uvicorn
 
+from utils.coldstart import format_report, profile_imports
 from utils.logger import logger
 from utils.manager import Manager
 
@@ -45,6 +48,52 @@ def db():
         logger.error("ERROR: Command must be 'db downgrade', 'db migrate' or 'db upgrade'")
 
 
+@manager.command
+def coldstart():
+    """
+    Reports import cost per module for a cold start, e.g.
+    `python manage.py coldstart [module] [--top 25] [--runs 3] [--max-ms 1500]`.
+    Exits with an error if the fastest run takes longer than --max-ms.
+    """
+    parser = argparse.ArgumentParser(prog="manage.py coldstart")
+    parser.add_argument("module", nargs="?", default="app")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args(sys.argv[2:])
+
+    # Import timings are noisy, so report the fastest run
+    timings, total = min((profile_imports(args.module) for _ in range(max(1, args.runs))), key=lambda run: run[1])
+    print(format_report(timings, total, top=args.top))
+
+    if args.max_ms is not None and total * 1000 > args.max_ms:
+        logger.error(f"ERROR: Importing {args.module} took {total * 1000:.0f} ms, over the {args.max_ms:.0f} ms budget")
+        sys.exit(1)
+
+
+@manager.command
+def worker():
+    """
+    Runs background jobs, e.g. `python manage.py worker [--concurrency 4] [--batch-size 4] [--once]`
+    """
+    import utils.archive  # noqa: F401  registers the zip job handler
+    from utils.job_queue import Worker
+
+    parser = argparse.ArgumentParser(prog="manage.py worker")
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--once", action="store_true", help="exit once there are no more jobs to claim")
+    args = parser.parse_args(sys.argv[2:])
+
+    job_worker = Worker(concurrency=args.concurrency, batch_size=args.batch_size)
+    # Finish the running jobs on SIGTERM (e.g. a deploy) instead of leaving them to lease expiry
+    signal.signal(signal.SIGTERM, lambda signum, frame: job_worker.stop())
+    try:
+        job_worker.run(once=args.once)
+    except KeyboardInterrupt:
+        job_worker.stop()
+
+
 def migrate(message):
     logger.info("Migrating database")
     command = f'alembic revision --autogenerate -m " {message}"'
@@ -4,3 +4,6 @@ which forces alembic to run through the models code and pick up all children of
 """
 
 from database import Base  # for import into alembic/env.py
+from models.chat_models import Conversation, ConversationMessage  # noqa: F401
+from models.cache_models import CachedChatResponse  # noqa: F401
+from models.job_models import Job  # noqa: F401
@@ -0,0 +1,19 @@
+"""
+Shared tier of the chat response cache, so identical payloads are answered once across all containers
+"""
+
+from sqlalchemy import JSON, Column, DateTime, Index, String
+
+from database import Base
+from utils.utils import get_utc_now
+
+
+class CachedChatResponse(Base):
+    __tablename__ = "cached_chat_responses"
+    __table_args__ = (Index("ix_cached_chat_responses_expires_at", "expires_at"),)
+
+    # sha256 hex digest of the canonical upstream payload
+    key = Column(String(64), primary_key=True)
+    response = Column(JSON, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=get_utc_now)
+    expires_at = Column(DateTime, nullable=False)
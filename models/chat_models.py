@@ -0,0 +1,50 @@
+"""
+Server-side conversation history, so clients only need to submit new messages on each turn
+"""
+
+import uuid
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text, UniqueConstraint
+from sqlalchemy.orm import relationship
+
+from database import Base
+from utils.utils import get_utc_now
+
+
+def generate_conversation_id() -> str:
+    return str(uuid.uuid4())
+
+
+class Conversation(Base):
+    __tablename__ = "conversations"
+
+    id = Column(String(36), primary_key=True, default=generate_conversation_id)
+    # Number of stored messages, also the position of the next message. Used to check cached histories are current.
+    message_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, default=get_utc_now)
+    updated_at = Column(DateTime, nullable=False, default=get_utc_now, onupdate=get_utc_now)
+
+    messages = relationship(
+        "ConversationMessage",
+        back_populates="conversation",
+        order_by="ConversationMessage.position",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+
+class ConversationMessage(Base):
+    __tablename__ = "conversation_messages"
+    __table_args__ = (UniqueConstraint("conversation_id", "position", name="uq_conversation_messages_position"),)
+
+    id = Column(Integer, primary_key=True)
+    conversation_id = Column(String(36), ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    sender = Column(String(255), nullable=False)
+    message = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=get_utc_now)
+
+    conversation = relationship("Conversation", back_populates="messages")
+
+    def to_dict(self) -> dict:
+        return {"sender": self.sender, "message": self.message}
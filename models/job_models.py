@@ -0,0 +1,52 @@
+"""
+Background jobs, claimed and run by `manage.py worker` processes
+"""
+
+from sqlalchemy import JSON, Column, DateTime, Index, Integer, String, Text
+
+from constants import JobStatus
+from database import Base
+from utils.utils import get_utc_now
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Claim scans, and the per-owner in-progress count
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index("ix_jobs_owner_id_status", "owner_id", "status"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    # Whoever the job runs on behalf of, e.g. a cognito_id. At most MAX_IN_PROGRESS jobs per owner run at once.
+    owner_id = Column(String(255), nullable=False)
+    job_type = Column(String(64), nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    status = Column(String(20), nullable=False, default=JobStatus.PENDING.value)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    # Not claimed before this time, used to back off retries
+    run_after = Column(DateTime, nullable=False, default=get_utc_now)
+
+    # Set while a worker holds the job. A job whose lease expires (its worker stopped heartbeating) is claimable again.
+    locked_by = Column(String(64), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime, nullable=False, default=get_utc_now)
+    updated_at = Column(DateTime, nullable=False, default=get_utc_now, onupdate=get_utc_now)
+    completed_at = Column(DateTime, nullable=True)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "owner_id": self.owner_id,
+            "job_type": self.job_type,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "attempts": self.attempts,
+        }
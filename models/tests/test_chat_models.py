@@ -0,0 +1,49 @@
+"""
+Tests for the conversation models and store
+"""
+
+import asyncio
+
+import pytest
+
+from exceptions import ChatDemoException
+from models.chat_models import Conversation, ConversationMessage
+from utils.conversation_store import conversation_store
+from utils.test_utils import BaseTestCase
+
+
+class TestConversationStore(BaseTestCase):
+    def setup_method(self):
+        super().setup_method()
+        conversation_store.clear_cache()
+
+    def test_append_builds_history(self):
+        conversation_id = asyncio.run(conversation_store.create())
+
+        history = asyncio.run(conversation_store.append(conversation_id, [{"sender": "user", "message": "Hello"}]))
+        assert history == [{"sender": "user", "message": "Hello"}]
+
+        history = asyncio.run(conversation_store.append(conversation_id, [{"sender": "Bot", "message": "Hi"}]))
+        assert history == [{"sender": "user", "message": "Hello"}, {"sender": "Bot", "message": "Hi"}]
+
+        conversation = self.session.get(Conversation, conversation_id)
+        assert conversation.message_count == 2
+        assert [message.position for message in conversation.messages] == [0, 1]
+
+    def test_stale_cache_is_reloaded(self):
+        conversation_id = asyncio.run(conversation_store.create())
+        asyncio.run(conversation_store.append(conversation_id, [{"sender": "user", "message": "Hello"}]))
+
+        # Simulate another container appending to the same conversation
+        conversation = self.session.get(Conversation, conversation_id)
+        self.session.add(ConversationMessage(conversation_id=conversation_id, position=1, sender="Bot", message="Hi"))
+        conversation.message_count = 2
+        self.session.commit()
+
+        history = asyncio.run(conversation_store.append(conversation_id, [{"sender": "user", "message": "Bye"}]))
+        assert [message["message"] for message in history] == ["Hello", "Hi", "Bye"]
+
+    def test_unknown_conversation(self):
+        with pytest.raises(ChatDemoException) as exc_info:
+            asyncio.run(conversation_store.append("does-not-exist", [{"sender": "user", "message": "Hello"}]))
+        assert exc_info.value.status_code == 404
@@ -0,0 +1,115 @@
+"""
+Tests for the job model and queue
+"""
+
+import datetime
+
+from constants import MAX_IN_PROGRESS, JobStatus
+from models.job_models import Job
+from utils import job_queue
+from utils.test_utils import BaseTestCase
+from utils.utils import get_utc_now
+
+
+class TestJobQueue(BaseTestCase):
+    def enqueue(self, owner_id, count=1, job_type="echo", **payload):
+        jobs = [job_queue.enqueue_job(self.session, owner_id, job_type, payload) for _ in range(count)]
+        self.session.commit()
+        return jobs
+
+    def test_claim_caps_jobs_per_owner(self):
+        self.enqueue("alice", MAX_IN_PROGRESS + 2)
+        self.enqueue("bob", 2)
+
+        claimed = job_queue.claim_jobs(self.session, "worker-1", limit=10)
+        owners = [job.owner_id for job in claimed]
+        assert owners.count("alice") == MAX_IN_PROGRESS
+        assert owners.count("bob") == 2
+
+        # Alice's remaining jobs wait until one of hers finishes
+        assert job_queue.claim_jobs(self.session, "worker-2", limit=10) == []
+        job_queue.complete_job(self.session, "worker-1", claimed[0].id, {"ok": True})
+        assert [job.owner_id for job in job_queue.claim_jobs(self.session, "worker-2", limit=10)] == ["alice"]
+
+    def test_owner_at_cap_does_not_starve_others(self):
+        self.enqueue("alice", MAX_IN_PROGRESS)
+        assert len(job_queue.claim_jobs(self.session, "worker-1", limit=MAX_IN_PROGRESS)) == MAX_IN_PROGRESS
+
+        # Alice's backlog is older than Bob's job and larger than a claim batch
+        self.enqueue("alice", 20)
+        (bob,) = self.enqueue("bob")
+        claimed = job_queue.claim_jobs(self.session, "worker-2", limit=1)
+        assert [job.id for job in claimed] == [bob.id]
+
+    def test_expired_lease_is_reclaimed(self):
+        (job,) = self.enqueue("alice")
+        (claimed,) = job_queue.claim_jobs(self.session, "worker-1", limit=1)
+        assert claimed.attempts == 1
+
+        # worker-1 stops heartbeating
+        self.session.query(Job).update({"lease_expires_at": get_utc_now() - datetime.timedelta(seconds=1)})
+        self.session.commit()
+        (reclaimed,) = job_queue.claim_jobs(self.session, "worker-2", limit=1)
+        assert reclaimed.id == job.id and reclaimed.attempts == 2
+
+        # worker-1 can neither renew nor finish a job it lost
+        assert job_queue.heartbeat_jobs(self.session, "worker-1", [job.id]) == 0
+        assert not job_queue.complete_job(self.session, "worker-1", job.id)
+        assert job_queue.heartbeat_jobs(self.session, "worker-2", [job.id]) == 1
+        assert job_queue.complete_job(self.session, "worker-2", job.id)
+
+    def test_lease_expiring_on_last_attempt_fails_job(self):
+        (job,) = self.enqueue("alice")
+        self.session.query(Job).update(
+            {
+                "status": JobStatus.PROCESSING.value,
+                "attempts": job.max_attempts,
+                "locked_by": "worker-1",
+                "lease_expires_at": get_utc_now() - datetime.timedelta(seconds=1),
+            }
+        )
+        self.session.commit()
+
+        assert job_queue.claim_jobs(self.session, "worker-2", limit=1) == []
+        self.session.expire_all()
+        assert self.session.get(Job, job.id).status == JobStatus.FAILED.value
+
+    def test_failed_attempts_back_off_then_fail(self):
+        (job,) = self.enqueue("alice")
+        for attempt in range(1, job.max_attempts + 1):
+            self.session.query(Job).update({"run_after": get_utc_now()})
+            self.session.commit()
+            job_queue.claim_jobs(self.session, "worker-1", limit=1)
+            assert job_queue.fail_job(self.session, "worker-1", job.id, "boom")
+
+            self.session.expire_all()
+            job = self.session.get(Job, job.id)
+            if attempt < job.max_attempts:
+                assert job.status == JobStatus.PENDING.value
+                assert job.run_after > get_utc_now()
+        assert job.status == JobStatus.FAILED.value
+        assert job.error == "boom"
+
+    def test_worker_runs_jobs(self):
+        self.enqueue("alice", 3, value=1)
+        self.enqueue("bob", 1, job_type="explode")
+        self.enqueue("bob", 1, job_type="unknown")
+
+        def explode(payload):
+            raise RuntimeError("exploded")
+
+        handlers = {"echo": lambda payload: {"value": payload["value"]}, "explode": explode}
+        worker = job_queue.Worker(concurrency=2, batch_size=2, poll_interval=0.05, handlers=handlers)
+        worker.run(once=True)
+
+        assert worker.completed == 3
+        assert worker.failed == 2
+        self.session.expire_all()
+        statuses = {job.job_type: job.status for job in self.session.query(Job)}
+        assert statuses == {
+            "echo": JobStatus.COMPLETED.value,
+            # retried later, with backoff
+            "explode": JobStatus.PENDING.value,
+            "unknown": JobStatus.FAILED.value,
+        }
+        assert {job.result["value"] for job in self.session.query(Job).filter_by(job_type="echo")} == {1}
@@ -0,0 +1,135 @@
+import json
+import zipfile
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from config import settings
+from constants import FileType
+from utils.job_queue import register_job_handler
+from utils.logger import logger
+from utils.s3 import iter_file, upload_stream
+from utils.utils import format_file_size, get_utc_now
+
+MANIFEST_NAME = "manifest.json"
+
+
+class _ChunkSink:
+    """
+    Write-only, unseekable file object that collects what zipfile writes until it is drained. zipfile then writes
+    entries with data descriptors, so no part of the archive needs to be rewritten once written.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self._chunks = self._chunks, []
+        yield from chunks
+
+
+def iter_zip(entries: Iterable[Tuple[str, Iterable[bytes]]], compresslevel: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Builds a zip archive from (name, chunks) entries and yields it chunk by chunk. Only the chunk being compressed
+    and the compressor's own buffer are held in memory, however large the entries are. Entries always use ZIP64, so
+    neither entries nor the archive are limited to 4 GB.
+    """
+    sink = _ChunkSink()
+    date_time = get_utc_now().timetuple()[:6]
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as archive:
+        for name, chunks in entries:
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            # The size isn't known up front, so ask for ZIP64 sizes in case the entry turns out to be large
+            with archive.open(info, "w", force_zip64=True) as entry:
+                for chunk in chunks:
+                    entry.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
+
+
+def zip_files_to_s3(
+    bucket_name: str,
+    file_keys: Iterable[str],
+    destination_key: str,
+    destination_bucket: Optional[str] = None,
+    prefix: str = "",
+    include_manifest: bool = True,
+    part_size: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+) -> Optional[dict]:
+    """
+    Zips files from an S3 bucket into a new object, streaming them from S3 through the compressor into a multipart
+    upload. Memory use is bounded by the upload's parts in flight, about (max_concurrency + 1) * part_size, and not
+    by the size of the files. Entries are named by their key without `prefix`.
+
+    Returns the manifest (each entry's name and size, and the totals), which is also stored in the archive as
+    manifest.json unless `include_manifest` is False, or None if the archive couldn't be created.
+    """
+    destination_bucket = destination_bucket or bucket_name
+    manifest = {"files": [], "total_size": 0}
+
+    def counted(name: str, file_key: str) -> Iterator[bytes]:
+        size = 0
+        for chunk in iter_file(bucket_name, file_key):
+            size += len(chunk)
+            yield chunk
+        manifest["files"].append({"name": name, "key": file_key, "size": size, "size_display": format_file_size(size)})
+        manifest["total_size"] += size
+
+    def entries() -> Iterator[Tuple[str, Iterable[bytes]]]:
+        for file_key in file_keys:
+            name = file_key[len(prefix) :] if prefix and file_key.startswith(prefix) else file_key
+            yield name, counted(name, file_key)
+        if include_manifest:
+            manifest["total_size_display"] = format_file_size(manifest["total_size"])
+            yield MANIFEST_NAME, [json.dumps(manifest, indent=2).encode("utf-8")]
+
+    archive_size = 0
+
+    def archive_chunks() -> Iterator[bytes]:
+        nonlocal archive_size
+        for chunk in iter_zip(entries()):
+            archive_size += len(chunk)
+            yield chunk
+
+    uploaded = upload_stream(
+        archive_chunks(),
+        destination_bucket,
+        destination_key,
+        content_type="application/zip",
+        part_size=part_size or settings.S3_ARCHIVE_PART_SIZE,
+        max_concurrency=max_concurrency or settings.S3_ARCHIVE_MAX_CONCURRENCY,
+    )
+    if not uploaded:
+        logger.error(f"Error zipping files to s3://{destination_bucket}/{destination_key}")
+        return None
+
+    manifest["total_size_display"] = format_file_size(manifest["total_size"])
+    manifest["archive_size"] = archive_size
+    manifest["archive_size_display"] = format_file_size(archive_size)
+    return manifest
+
+
+@register_job_handler(FileType.ZIPPED_GENERATED.value)
+def zip_generated_files(payload: dict) -> dict:
+    """
+    Job handler that bundles a job's generated files. Payload: bucket, file_keys, destination_key, and optionally
+    destination_bucket and prefix.
+    """
+    manifest = zip_files_to_s3(
+        payload["bucket"],
+        payload["file_keys"],
+        payload["destination_key"],
+        destination_bucket=payload.get("destination_bucket"),
+        prefix=payload.get("prefix", ""),
+    )
+    if manifest is None:
+        raise RuntimeError("Creating the zip archive failed")
+    return manifest
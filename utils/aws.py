@@ -0,0 +1,98 @@
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from config import settings
+from utils.metrics import metrics
+
+# boto3 and botocore are imported on first use: they take a noticeable part of a cold start, and most requests never
+# touch AWS
+if TYPE_CHECKING:
+    import boto3
+    from botocore.config import Config
+
+# boto3 sessions are not thread safe, so sessions and clients are only ever created under this lock. The clients
+# themselves are thread safe and shared.
+_lock = threading.Lock()
+_sessions = {}
+_clients = {}
+
+
+def get_client_config() -> "Config":
+    from botocore.config import Config
+
+    return Config(
+        max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=settings.AWS_CONNECT_TIMEOUT,
+        read_timeout=settings.AWS_READ_TIMEOUT,
+        retries={"max_attempts": settings.AWS_MAX_ATTEMPTS, "mode": "standard"},
+    )
+
+
+def _get_session(profile_name: str | None) -> "boto3.session.Session":
+    import boto3
+
+    session = _sessions.get(profile_name)
+    if session is None:
+        session = boto3.session.Session(profile_name=profile_name)
+        _sessions[profile_name] = session
+    return session
+
+
+def get_client(service_name: str, region_name: str | None = None, profile_name: str | None = None):
+    """
+    Returns a shared boto3 client for (profile, service, region), creating it on first use. The profile defaults to
+    settings.AWS_PROFILE.
+    """
+    profile_name = profile_name or settings.AWS_PROFILE
+    key = (profile_name, service_name, region_name)
+
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                session = _get_session(profile_name)
+                client = session.client(service_name, region_name=region_name, config=get_client_config())
+                _instrument_client(client, service_name)
+                _clients[key] = client
+    return client
+
+
+def _instrument_client(client, service_name: str):
+    """
+    Times every API call made with the client as component `service_name` (e.g. "s3"), up to the response headers
+    """
+    service_id = client.meta.service_model.service_id.hyphenize()
+
+    def before_call(context, **kwargs):
+        context["metrics_started"] = time.perf_counter()
+
+    def after_call(http_response, context, **kwargs):
+        _record_call(service_name, context, failed=http_response.status_code >= 300)
+
+    def after_call_error(context, **kwargs):
+        _record_call(service_name, context, failed=True)
+
+    client.meta.events.register(f"before-call.{service_id}", before_call)
+    client.meta.events.register(f"after-call.{service_id}", after_call)
+    client.meta.events.register(f"after-call-error.{service_id}", after_call_error)
+
+
+def _record_call(service_name: str, context: dict, failed: bool):
+    started = context.pop("metrics_started", None)
+    if started is None:
+        return
+    labels = {"component": service_name}
+    metrics.observe("component_duration_seconds", time.perf_counter() - started, labels)
+    if failed:
+        metrics.inc("component_errors_total", labels)
+
+
+def reset_clients():
+    """
+    Drops all cached sessions and clients, e.g. between tests or after changing credentials
+    """
+    with _lock:
+        _clients.clear()
+        _sessions.clear()
@@ -0,0 +1,140 @@
+import datetime
+import hashlib
+import json
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+
+from config import settings
+from database import async_session_scope
+from models.cache_models import CachedChatResponse
+from utils.cache import TTLCache
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.utils import get_utc_now
+
+
+def payload_hash(payload: dict) -> str:
+    """
+    Hashes a JSON payload canonically, so that key order and whitespace don't produce different keys
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ChatResponseCache:
+    """
+    Caches upstream chat responses by payload hash.
+
+    Lookups check the in-process LRU tier first and then, if enabled, the shared Postgres tier. Shared hits are
+    copied into the local tier.
+    """
+
+    def __init__(self, enabled: bool, ttl: int, max_entries: int, max_bytes: int, shared: bool):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.shared = shared
+        self.local = TTLCache(max_entries=max_entries, ttl=ttl, max_size=max_bytes)
+
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.shared_errors = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+
+        response = self.local.get(key)
+        if response is not None or not self.shared:
+            return response
+
+        try:
+            response = await self._get_shared(key)
+        except Exception as e:
+            self.shared_errors += 1
+            logger.error(f"Error reading chat response cache: {str(e)}")
+            return None
+
+        if response is None:
+            self.shared_misses += 1
+            return None
+
+        self.shared_hits += 1
+        self.local.set(key, response, size=_response_size(response))
+        return response
+
+    async def set(self, key: str, response: dict):
+        if not self.enabled:
+            return
+
+        self.local.set(key, response, size=_response_size(response))
+        if not self.shared:
+            return
+
+        try:
+            await self._set_shared(key, response)
+        except Exception as e:
+            self.shared_errors += 1
+            logger.error(f"Error writing chat response cache: {str(e)}")
+
+    async def _get_shared(self, key: str) -> Optional[dict]:
+        async with async_session_scope() as session:
+            row = await session.get(CachedChatResponse, key)
+            if row is None or row.expires_at <= get_utc_now():
+                return None
+            return row.response
+
+    async def _set_shared(self, key: str, response: dict):
+        now = get_utc_now()
+        async with async_session_scope() as session:
+            await session.merge(
+                CachedChatResponse(
+                    key=key, response=response, created_at=now, expires_at=now + datetime.timedelta(seconds=self.ttl)
+                )
+            )
+            try:
+                await session.commit()
+            except IntegrityError:
+                # Another container stored the same payload first, which is just as good
+                await session.rollback()
+
+    async def purge_expired(self) -> int:
+        """
+        Deletes expired rows from the shared tier
+        """
+        async with async_session_scope() as session:
+            result = await session.execute(
+                delete(CachedChatResponse).where(CachedChatResponse.expires_at <= get_utc_now())
+            )
+            await session.commit()
+            return result.rowcount
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "local": self.local.stats(),
+            "shared": {
+                "enabled": self.shared,
+                "hits": self.shared_hits,
+                "misses": self.shared_misses,
+                "errors": self.shared_errors,
+            },
+        }
+
+
+def _response_size(response: dict) -> int:
+    return len(json.dumps(response, separators=(",", ":")))
+
+
+chat_cache = ChatResponseCache(
+    enabled=not settings.CACHE_DISABLED,
+    ttl=settings.CHAT_CACHE_TTL,
+    max_entries=settings.CHAT_CACHE_MAX_ENTRIES,
+    max_bytes=settings.CHAT_CACHE_MAX_BYTES,
+    shared=settings.CHAT_CACHE_SHARED,
+)
+metrics.register_collector("chat_cache", chat_cache.stats)
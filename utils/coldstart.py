@@ -0,0 +1,54 @@
+import os
+import re
+import subprocess
+import sys
+from typing import List, NamedTuple, Tuple
+
+# A line of `python -X importtime` output: "import time:  self [us] | cumulative | <indent>module"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> List[ImportTiming]:
+    timings = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            timings.append(ImportTiming(module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return timings
+
+
+def profile_imports(module: str = "app") -> Tuple[List[ImportTiming], float]:
+    """
+    Imports `module` in a fresh interpreter, as a cold start would, and returns the per-module import timings and
+    the total import time in seconds
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=os.environ.copy(),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    timings = parse_importtime(result.stderr)
+    total = next((t.cumulative_us for t in timings if t.module == module and t.depth == 0), 0)
+    return timings, total / 1_000_000
+
+
+def format_report(timings: List[ImportTiming], total: float, top: int = 25) -> str:
+    lines = [f"Total import time: {total * 1000:.0f} ms", "", f"{'cumulative':>12} {'self':>10}  module"]
+    for timing in sorted(timings, key=lambda t: t.cumulative_us, reverse=True)[:top]:
+        lines.append(
+            f"{timing.cumulative_us / 1000:>9.1f} ms {timing.self_us / 1000:>7.1f} ms  "
+            f"{'  ' * timing.depth}{timing.module}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,106 @@
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from sqlalchemy import select
+
+from config import settings
+from database import async_session_scope
+from exceptions import ChatDemoException
+from models.chat_models import Conversation, ConversationMessage, generate_conversation_id
+from utils.logger import logger
+
+
+class ConversationStore:
+    """
+    Conversation histories backed by Postgres, with an in-process LRU cache of recent conversations.
+
+    Every append locks the conversation row and compares the cached history length with the stored `message_count`,
+    so a history appended to by another container is reloaded rather than served stale. On a cache hit only the
+    conversation row is read, not the messages.
+    """
+
+    def __init__(self, max_cached: int):
+        self.max_cached = max_cached
+        self._cache: "OrderedDict[str, List[dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_cached(self, conversation_id: str) -> Optional[List[dict]]:
+        with self._lock:
+            history = self._cache.get(conversation_id)
+            if history is not None:
+                self._cache.move_to_end(conversation_id)
+            return history
+
+    def _set_cached(self, conversation_id: str, history: List[dict]):
+        if self.max_cached <= 0:
+            return
+        with self._lock:
+            self._cache[conversation_id] = history
+            self._cache.move_to_end(conversation_id)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+
+    async def create(self) -> str:
+        conversation_id = generate_conversation_id()
+        async with async_session_scope() as session:
+            session.add(Conversation(id=conversation_id, message_count=0))
+            await session.commit()
+
+        self._set_cached(conversation_id, [])
+        return conversation_id
+
+    async def get_history(self, conversation_id: str) -> List[dict]:
+        async with async_session_scope() as session:
+            conversation = await session.get(Conversation, conversation_id)
+            if conversation is None:
+                raise ChatDemoException("Conversation not found", status_code=404)
+            return await self._load_history(session, conversation)
+
+    async def append(self, conversation_id: str, messages: List[dict]) -> List[dict]:
+        """
+        Appends messages to a conversation and returns the full history, including the new messages
+        """
+        async with async_session_scope() as session:
+            conversation = await session.get(Conversation, conversation_id, with_for_update=True)
+            if conversation is None:
+                raise ChatDemoException("Conversation not found", status_code=404)
+
+            history = await self._load_history(session, conversation)
+            for offset, message in enumerate(messages):
+                session.add(
+                    ConversationMessage(
+                        conversation_id=conversation_id,
+                        position=conversation.message_count + offset,
+                        sender=message["sender"],
+                        message=message["message"],
+                    )
+                )
+            conversation.message_count += len(messages)
+            await session.commit()
+
+        history = history + [{"sender": message["sender"], "message": message["message"]} for message in messages]
+        self._set_cached(conversation_id, history)
+        return history
+
+    async def _load_history(self, session, conversation: Conversation) -> List[dict]:
+        history = self._get_cached(conversation.id)
+        if history is not None and len(history) == conversation.message_count:
+            return history
+
+        logger.debug("Loading conversation %s from the database", conversation.id)
+        rows = await session.scalars(
+            select(ConversationMessage)
+            .where(ConversationMessage.conversation_id == conversation.id)
+            .order_by(ConversationMessage.position)
+        )
+        history = [row.to_dict() for row in rows]
+        self._set_cached(conversation.id, history)
+        return history
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+
+conversation_store = ConversationStore(max_cached=settings.CONVERSATION_CACHE_SIZE)
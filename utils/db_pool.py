@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, Pool, QueuePool
+
+from config import settings
+
+POOL_PROFILES = ("null", "lambda", "server")
+
+
+def get_pool_profile() -> str:
+    """
+    Picks the pooling profile. "auto" means "lambda" when running in Lambda and "server" otherwise.
+    """
+    profile = settings.DB_POOL_PROFILE.lower()
+    if profile == "auto":
+        return "lambda" if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") else "server"
+    if profile not in POOL_PROFILES:
+        raise ValueError(f"DB_POOL_PROFILE must be one of auto, {', '.join(POOL_PROFILES)}")
+    return profile
+
+
+class PoolStats:
+    """
+    Counters for one connection pool. Listeners added with `add_listener` are called as
+    `listener(event_name, stats, duration)` on every checkout ("checkout" or "checkout_timeout") and new connection
+    ("connect"), e.g. to forward them to a metrics backend.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool: Optional[Pool] = None
+        self.listeners: List[Callable] = []
+        self._lock = threading.Lock()
+
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.checkout_timeouts = 0
+        self.checkout_time_total = 0.0
+        self.checkout_time_max = 0.0
+        self.max_overflow_seen = 0
+
+    def add_listener(self, listener: Callable):
+        self.listeners.append(listener)
+
+    def _notify(self, event_name: str, duration: float = 0.0):
+        for listener in self.listeners:
+            listener(event_name, self, duration)
+
+    def record_checkout(self, duration: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.checkout_timeouts += 1
+            else:
+                self.checkouts += 1
+                self.checkout_time_total += duration
+                self.checkout_time_max = max(self.checkout_time_max, duration)
+            if isinstance(self.pool, QueuePool):
+                self.max_overflow_seen = max(self.max_overflow_seen, self.pool.overflow())
+        self._notify("checkout_timeout" if timed_out else "checkout", duration)
+
+    def stats(self) -> dict:
+        stats = {
+            "pool": type(self.pool).__name__ if self.pool is not None else None,
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "invalidations": self.invalidations,
+            "checkout_timeouts": self.checkout_timeouts,
+            "checkout_time_total": self.checkout_time_total,
+            "checkout_time_max": self.checkout_time_max,
+            "max_overflow_seen": self.max_overflow_seen,
+        }
+        if isinstance(self.pool, QueuePool):
+            stats.update(
+                size=self.pool.size(),
+                checked_in=self.pool.checkedin(),
+                checked_out=self.pool.checkedout(),
+                overflow=self.pool.overflow(),
+            )
+        return stats
+
+
+class _TimedPoolMixin:
+    """
+    Times `connect()`, i.e. how long callers wait for a connection from the pool
+    """
+
+    pool_stats: PoolStats
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.pool_stats.record_checkout(time.perf_counter() - started, timed_out=True)
+            raise
+        self.pool_stats.record_checkout(time.perf_counter() - started)
+        return connection
+
+
+def _timed_pool_class(pool_class: type, stats: PoolStats) -> type:
+    # The stats live on the class so that pools recreated by `engine.dispose()` keep reporting to them
+    return type(f"Timed{pool_class.__name__}", (_TimedPoolMixin, pool_class), {"pool_stats": stats})
+
+
+def get_engine_options(uri, stats: PoolStats, is_async: bool = False) -> dict:
+    """
+    Builds `create_engine` pooling options for the configured profile, with checkout timing for `stats`
+    """
+    profile = get_pool_profile()
+    if profile == "null" or make_url(uri).get_backend_name() == "sqlite":
+        # RDS Proxy (or similar) does the pooling; we open a connection per checkout
+        return {"poolclass": _timed_pool_class(NullPool, stats)}
+
+    if profile == "lambda":
+        # Each container serves one request at a time, so keep very few connections, and check them before use
+        # since a frozen container's connections may have been closed server side in the meantime
+        options = dict(
+            pool_size=settings.DB_LAMBDA_POOL_SIZE,
+            max_overflow=settings.DB_LAMBDA_MAX_OVERFLOW,
+            pool_recycle=settings.DB_LAMBDA_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+    else:
+        options = dict(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+
+    pool_class = AsyncAdaptedQueuePool if is_async else QueuePool
+    return dict(options, pool_timeout=settings.DB_POOL_TIMEOUT, poolclass=_timed_pool_class(pool_class, stats))
+
+
+def instrument_engine(engine, stats: PoolStats):
+    """
+    Attaches pool event listeners to a (sync) engine. For an AsyncEngine, pass its `sync_engine`.
+    """
+    stats.pool = engine.pool
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        with stats._lock:
+            stats.connects += 1
+        stats._notify("connect")
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        with stats._lock:
+            stats.checkins += 1
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        with stats._lock:
+            stats.invalidations += 1
+
+    @event.listens_for(engine, "engine_disposed")
+    def on_disposed(engine):
+        stats.pool = engine.pool
@@ -0,0 +1,130 @@
+import asyncio
+import time
+from contextvars import ContextVar, Token
+from typing import Awaitable, Optional, TypeVar
+
+from config import settings
+from exceptions import ChatDemoException
+
+T = TypeVar("T")
+
+DEADLINE_HEADER = b"x-request-timeout"
+
+# Monotonic time by which the current request must have produced its response, if it has a deadline
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+def set_deadline(timeout: Optional[float]) -> Token:
+    return _deadline.set(None if timeout is None else time.monotonic() + timeout)
+
+
+def reset_deadline(token: Token):
+    _deadline.reset(token)
+
+
+def time_left() -> Optional[float]:
+    """
+    Seconds left before the current request's deadline, or None if it has none
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def deadline_exceeded(what: str) -> ChatDemoException:
+    return ChatDemoException(f"Not enough time left to complete the {what}", status_code=504)
+
+
+def ensure_time_left(what: str) -> Optional[float]:
+    """
+    Returns the time left, failing with a 504 if it is less than DEADLINE_MIN_BUDGET, i.e. too little to usefully
+    start the `what`
+    """
+    left = time_left()
+    if left is not None and left < settings.DEADLINE_MIN_BUDGET:
+        raise deadline_exceeded(what)
+    return left
+
+
+async def within_deadline(awaitable: Awaitable[T], what: str) -> T:
+    """
+    Awaits `awaitable`, cancelling it with a 504 if the request's deadline passes first
+    """
+    try:
+        left = ensure_time_left(what)
+    except ChatDemoException:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+
+    if left is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout=left)
+    except asyncio.TimeoutError:
+        raise deadline_exceeded(what)
+
+
+async def without_deadline(awaitable: Awaitable[T]) -> T:
+    """
+    Awaits `awaitable` with no deadline, for work shared by requests with different deadlines (e.g. a SingleFlight
+    call), which each wait on it for as long as their own deadline allows. Only use this as the body of a task of its
+    own, since it clears the deadline for the rest of the task.
+    """
+    _deadline.set(None)
+    return await awaitable
+
+
+def request_timeout(scope: dict) -> Optional[float]:
+    """
+    Picks the time budget for a request: the shortest of what the Lambda invocation has left, the
+    X-Request-Timeout header (in seconds) and REQUEST_TIMEOUT. The safety margin leaves time to send an error
+    response before Lambda kills the invocation.
+    """
+    budgets = []
+    context = scope.get("aws.context")
+    if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+        budgets.append(context.get_remaining_time_in_millis() / 1000)
+
+    for name, value in scope.get("headers", []):
+        if name == DEADLINE_HEADER:
+            try:
+                budgets.append(float(value))
+            except ValueError:
+                pass
+
+    if settings.REQUEST_TIMEOUT > 0:
+        budgets.append(settings.REQUEST_TIMEOUT)
+
+    return min(budgets) - settings.DEADLINE_SAFETY_MARGIN if budgets else None
+
+
+class DeadlineMiddleware:
+    """
+    Sets the deadline for each HTTP request. Plain ASGI rather than BaseHTTPMiddleware, so the context variable is
+    visible to the endpoint and to streaming response bodies.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = set_deadline(request_timeout(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_deadline(token)
+
+
+def apply_statement_timeout(session, transaction, connection):
+    """
+    SQLAlchemy `after_begin` listener that caps Postgres statements at the time the request has left, so a slow
+    query is cancelled by the server rather than outliving the request
+    """
+    left = time_left()
+    if left is None or connection.dialect.name != "postgresql":
+        return
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(left * 1000))}")
@@ -0,0 +1,70 @@
+import math
+from typing import List
+
+from config import settings
+
+CHARS_PER_TOKEN = 4
+
+# Rough allowance for the sender name and separators each message adds to the upstream prompt
+MESSAGE_OVERHEAD_CHARS = 4
+
+
+def message_size(sender: str, message: str) -> int:
+    """
+    Size of a message in characters. len() is O(1) on strings, so this isn't worth caching.
+    """
+    return len(sender) + len(message) + MESSAGE_OVERHEAD_CHARS
+
+
+def estimate_tokens(chars: int) -> int:
+    return math.ceil(chars / CHARS_PER_TOKEN)
+
+
+class HistoryCompactor:
+    """
+    Trims a chat history to the most recent messages that fit a character, token and message count budget.
+
+    The newest message is always kept, even if it alone is over budget. Older messages are dropped; we don't
+    summarize them since that would take an extra upstream call per turn.
+    """
+
+    def __init__(self, max_chars: int = 0, max_tokens: int = 0, max_messages: int = 0):
+        budgets = [budget for budget in (max_chars, max_tokens * CHARS_PER_TOKEN) if budget > 0]
+        self.max_chars = min(budgets) if budgets else 0
+        self.max_messages = max_messages
+
+        self.compacted = 0
+        self.dropped_messages = 0
+
+    def compact(self, messages: List[dict]) -> List[dict]:
+        if not self.max_chars and not self.max_messages:
+            return messages
+
+        # Walk back from the newest message, so the cost is proportional to what we keep, not the whole history
+        total = 0
+        start = len(messages)
+        while start > 0:
+            if self.max_messages and len(messages) - start >= self.max_messages:
+                break
+            size = message_size(messages[start - 1]["sender"], messages[start - 1]["message"])
+            if self.max_chars and total + size > self.max_chars and start < len(messages):
+                break
+            total += size
+            start -= 1
+
+        if start == 0:
+            return messages
+
+        self.compacted += 1
+        self.dropped_messages += start
+        return messages[start:]
+
+    def stats(self) -> dict:
+        return {"compacted": self.compacted, "dropped_messages": self.dropped_messages}
+
+
+history_compactor = HistoryCompactor(
+    max_chars=settings.CHAT_HISTORY_MAX_CHARS,
+    max_tokens=settings.CHAT_HISTORY_MAX_TOKENS,
+    max_messages=settings.CHAT_HISTORY_MAX_MESSAGES,
+)
@@ -0,0 +1,66 @@
+import asyncio
+
+import httpx
+
+from config import settings
+from utils.logger import logger
+
+client = None
+_client_loop = None
+
+
+def _http2_available() -> bool:
+    if not settings.UPSTREAM_HTTP2:
+        return False
+    try:
+        import h2  # type: ignore # noqa: F401
+    except ImportError:
+        logger.warning("UPSTREAM_HTTP2 is enabled but the `h2` package is not installed, falling back to HTTP/1.1")
+        return False
+    return True
+
+
+def build_http_client() -> httpx.AsyncClient:
+    """
+    Builds the upstream client with keep-alive connection pooling and explicit timeouts
+    """
+    limits = httpx.Limits(
+        max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        connect=settings.UPSTREAM_CONNECT_TIMEOUT,
+        read=settings.UPSTREAM_READ_TIMEOUT,
+        write=settings.UPSTREAM_WRITE_TIMEOUT,
+        pool=settings.UPSTREAM_POOL_TIMEOUT,
+    )
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=_http2_available())
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the process-wide upstream client, creating it on first use.
+
+    Pooled connections are bound to the event loop that opened them. Mangum reuses a single loop across warm
+    invocations, so the pool survives between Lambda events, but if we find ourselves on a different loop (e.g. the
+    test client spins up a new one) the stale client is dropped and a fresh one is built.
+    """
+    global client, _client_loop
+
+    loop = asyncio.get_running_loop()
+    if client is None or client.is_closed or _client_loop is not loop:
+        logger.info("Creating upstream HTTP client")
+        client = build_http_client()
+        _client_loop = loop
+    return client
+
+
+async def close_http_client():
+    global client, _client_loop
+
+    if client is not None and not client.is_closed:
+        logger.info("Closing upstream HTTP client")
+        await client.aclose()
+    client = None
+    _client_loop = None
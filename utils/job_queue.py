@@ -0,0 +1,370 @@
+import datetime
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import func, select, update
+
+from config import settings
+from constants import MAX_IN_PROGRESS, JobStatus
+from database import session_scope
+from models.job_models import Job
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.utils import get_utc_now
+
+JobHandler = Callable[[dict], Optional[dict]]
+
+# Handlers by job type, added with `register_job_handler`
+job_handlers: Dict[str, JobHandler] = {}
+
+
+def register_job_handler(job_type: str):
+    """
+    Registers the decorated function to run jobs of `job_type`. It is called with the job's payload and may return a
+    JSON-serializable result; raising fails the attempt.
+    """
+
+    def decorator(handler: JobHandler) -> JobHandler:
+        job_handlers[job_type] = handler
+        return handler
+
+    return decorator
+
+
+class ClaimedJob(NamedTuple):
+    id: int
+    owner_id: str
+    job_type: str
+    payload: dict
+    attempts: int
+
+
+def enqueue_job(session, owner_id: str, job_type: str, payload: dict, max_attempts: Optional[int] = None) -> Job:
+    job = Job(
+        owner_id=owner_id,
+        job_type=job_type,
+        payload=payload,
+        status=JobStatus.PENDING.value,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+    session.add(job)
+    session.flush()
+    return job
+
+
+def _claimable(now: datetime.datetime):
+    # Pending jobs that are due, and jobs whose worker stopped renewing its lease
+    return ((Job.status == JobStatus.PENDING.value) & (Job.run_after <= now)) | (
+        (Job.status == JobStatus.PROCESSING.value) & (Job.lease_expires_at <= now)
+    )
+
+
+def claim_jobs(session, worker_id: str, limit: int) -> List[ClaimedJob]:
+    """
+    Claims up to `limit` jobs for `worker_id`, oldest first, without exceeding MAX_IN_PROGRESS running jobs per owner.
+
+    The cap is applied in the candidate query: each owner's claimable jobs are ranked oldest first and only those
+    that fit beside the owner's running jobs are candidates, so an owner with a long backlog can't crowd out everyone
+    else. Candidates are locked with FOR UPDATE SKIP LOCKED, so concurrent workers claim disjoint jobs without
+    waiting on each other. The per-owner count is then taken again under a transaction-scoped advisory lock on the
+    owner, so two workers can't both fill an owner's last slot. Commits the claim.
+    """
+    now = get_utc_now()
+
+    # Jobs that keep losing their lease (e.g. they crash the worker) are given up on rather than retried forever
+    session.execute(
+        update(Job)
+        .where(
+            Job.status == JobStatus.PROCESSING.value,
+            Job.lease_expires_at <= now,
+            Job.attempts >= Job.max_attempts,
+        )
+        .values(
+            status=JobStatus.FAILED.value,
+            error="Lease expired on the last attempt",
+            locked_by=None,
+            lease_expires_at=None,
+            completed_at=now,
+        )
+    )
+
+    running = (
+        select(Job.owner_id, func.count().label("running"))
+        .where(Job.status == JobStatus.PROCESSING.value, Job.lease_expires_at > now)
+        .group_by(Job.owner_id)
+        .subquery()
+    )
+    ranked = (
+        select(
+            Job.id,
+            Job.owner_id,
+            func.row_number().over(partition_by=Job.owner_id, order_by=(Job.run_after, Job.id)).label("rank"),
+        )
+        .where(_claimable(now))
+        .subquery()
+    )
+    within_cap = (
+        select(ranked.c.id)
+        .outerjoin(running, running.c.owner_id == ranked.c.owner_id)
+        .where(ranked.c.rank + func.coalesce(running.c.running, 0) <= MAX_IN_PROGRESS)
+    )
+    # Postgres doesn't allow FOR UPDATE alongside window functions, so the rows are locked by an outer query
+    candidates = session.execute(
+        select(Job.id, Job.owner_id)
+        .where(Job.id.in_(within_cap))
+        .order_by(Job.run_after, Job.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not candidates:
+        session.commit()
+        return []
+
+    owners = sorted({c.owner_id for c in candidates})
+    if session.get_bind().dialect.name == "postgresql":
+        # Always in the same order, so workers can't deadlock on each other's owners
+        for owner in owners:
+            session.execute(select(func.pg_advisory_xact_lock(func.hashtext(owner))))
+
+    in_progress = dict(
+        session.execute(
+            select(Job.owner_id, func.count())
+            .where(
+                Job.owner_id.in_(owners),
+                Job.status == JobStatus.PROCESSING.value,
+                Job.lease_expires_at > now,
+            )
+            .group_by(Job.owner_id)
+        ).all()
+    )
+
+    chosen = []
+    for candidate in candidates:
+        if len(chosen) >= limit:
+            break
+        if in_progress.get(candidate.owner_id, 0) >= MAX_IN_PROGRESS:
+            continue
+        chosen.append(candidate.id)
+        in_progress[candidate.owner_id] = in_progress.get(candidate.owner_id, 0) + 1
+
+    claimed = []
+    if chosen:
+        session.execute(
+            update(Job)
+            .where(Job.id.in_(chosen))
+            .values(
+                status=JobStatus.PROCESSING.value,
+                locked_by=worker_id,
+                attempts=Job.attempts + 1,
+                heartbeat_at=now,
+                lease_expires_at=now + datetime.timedelta(seconds=settings.JOB_LEASE_SECONDS),
+            )
+        )
+        rows = session.execute(
+            select(Job.id, Job.owner_id, Job.job_type, Job.payload, Job.attempts)
+            .where(Job.id.in_(chosen))
+            .order_by(Job.run_after, Job.id)
+        ).all()
+        claimed = [ClaimedJob(*row) for row in rows]
+
+    session.commit()
+    return claimed
+
+
+def heartbeat_jobs(session, worker_id: str, job_ids: List[int]) -> int:
+    """
+    Extends the leases of jobs this worker still holds. Returns how many it still holds.
+    """
+    if not job_ids:
+        return 0
+    now = get_utc_now()
+    result = session.execute(
+        update(Job)
+        .where(Job.id.in_(job_ids), Job.locked_by == worker_id, Job.status == JobStatus.PROCESSING.value)
+        .values(heartbeat_at=now, lease_expires_at=now + datetime.timedelta(seconds=settings.JOB_LEASE_SECONDS))
+    )
+    session.commit()
+    return result.rowcount
+
+
+def complete_job(session, worker_id: str, job_id: int, result: Optional[dict] = None) -> bool:
+    """
+    Marks a job completed, unless this worker lost it (its lease expired and another worker claimed it)
+    """
+    now = get_utc_now()
+    updated = session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.locked_by == worker_id, Job.status == JobStatus.PROCESSING.value)
+        .values(
+            status=JobStatus.COMPLETED.value,
+            result=result,
+            error=None,
+            locked_by=None,
+            lease_expires_at=None,
+            completed_at=now,
+        )
+    )
+    session.commit()
+    return updated.rowcount == 1
+
+
+def fail_job(session, worker_id: str, job_id: int, error: str, retry: bool = True) -> bool:
+    """
+    Records a failed attempt. The job goes back to pending with exponential backoff until it runs out of attempts.
+    """
+    now = get_utc_now()
+    job = session.execute(
+        select(Job).where(Job.id == job_id, Job.locked_by == worker_id).with_for_update()
+    ).scalar_one_or_none()
+    if job is None or job.status != JobStatus.PROCESSING.value:
+        session.commit()
+        return False
+
+    job.error = error
+    job.locked_by = None
+    job.lease_expires_at = None
+    if retry and job.attempts < job.max_attempts:
+        job.status = JobStatus.PENDING.value
+        job.run_after = now + datetime.timedelta(seconds=settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1))
+    else:
+        job.status = JobStatus.FAILED.value
+        job.completed_at = now
+    session.commit()
+    return True
+
+
+class Worker:
+    """
+    Claims jobs in batches and runs them on a thread pool of `concurrency` threads. A heartbeat thread keeps the
+    leases of running jobs alive, so that if this process dies its jobs become claimable again once their leases
+    expire.
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        handlers: Optional[Dict[str, JobHandler]] = None,
+        worker_id: Optional[str] = None,
+    ):
+        self.concurrency = concurrency or settings.JOB_CONCURRENCY
+        self.batch_size = batch_size or settings.JOB_BATCH_SIZE
+        self.poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.handlers = job_handlers if handlers is None else handlers
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"[:64]
+
+        self.stop_event = threading.Event()
+        self._running: Dict[int, ClaimedJob] = {}
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(self.concurrency)
+
+        self.completed = 0
+        self.failed = 0
+
+    def run(self, once: bool = False):
+        """
+        Runs until `stop()` is called or, with `once`, until no more jobs can be claimed. Running jobs are finished
+        before returning.
+        """
+        logger.info("Worker %s started with concurrency %d", self.worker_id, self.concurrency)
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, args=(heartbeat_stop,), name="job-heartbeat")
+        heartbeat.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="job") as executor:
+                while not self.stop_event.is_set():
+                    if not self.run_once(executor):
+                        if once and not self._running:
+                            break
+                        self.stop_event.wait(self.poll_interval)
+        finally:
+            # Only once the running jobs are done, so their leases are kept until then
+            heartbeat_stop.set()
+            heartbeat.join()
+        logger.info("Worker %s stopped: %d completed, %d failed", self.worker_id, self.completed, self.failed)
+
+    def run_once(self, executor: ThreadPoolExecutor) -> int:
+        """
+        Claims as many jobs as there are free slots (up to the batch size) and submits them. Returns the number
+        claimed.
+        """
+        if not self._slots.acquire(timeout=self.poll_interval or None):
+            return 0
+        free = 1
+        while free < self.batch_size and self._slots.acquire(blocking=False):
+            free += 1
+
+        try:
+            with session_scope() as session:
+                jobs = claim_jobs(session, self.worker_id, free)
+        except Exception as e:
+            logger.error(f"Error claiming jobs: {str(e)}")
+            jobs = []
+
+        for _ in range(free - len(jobs)):
+            self._slots.release()
+        for job in jobs:
+            with self._lock:
+                self._running[job.id] = job
+            executor.submit(self._run_job, job)
+        if jobs:
+            metrics.inc("jobs_claimed_total", value=len(jobs))
+        return len(jobs)
+
+    def _run_job(self, job: ClaimedJob):
+        try:
+            succeeded = self._execute(job)
+            with self._lock:
+                if succeeded:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+        except Exception as e:
+            logger.error(f"Error running job {job.id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._running.pop(job.id, None)
+            self._slots.release()
+
+    def _execute(self, job: ClaimedJob) -> bool:
+        handler = self.handlers.get(job.job_type)
+        if handler is None:
+            with session_scope() as session:
+                fail_job(session, self.worker_id, job.id, f"No handler for job type {job.job_type}", retry=False)
+            return False
+
+        try:
+            with metrics.timer(f"job.{job.job_type}"):
+                result = handler(job.payload)
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.job_type}) failed: {str(e)}")
+            with session_scope() as session:
+                fail_job(session, self.worker_id, job.id, str(e))
+            return False
+
+        with session_scope() as session:
+            if not complete_job(session, self.worker_id, job.id, result):
+                logger.warning("Job %s finished after its lease was lost, result discarded", job.id)
+                return False
+        return True
+
+    def _heartbeat_loop(self, stop: threading.Event):
+        while not stop.wait(settings.JOB_HEARTBEAT_INTERVAL):
+            with self._lock:
+                job_ids = list(self._running)
+            try:
+                with session_scope() as session:
+                    held = heartbeat_jobs(session, self.worker_id, job_ids)
+                if held < len(job_ids):
+                    logger.warning("Worker %s lost the lease on %d jobs", self.worker_id, len(job_ids) - held)
+            except Exception as e:
+                logger.error(f"Error sending job heartbeats: {str(e)}")
+
+    def stop(self):
+        self.stop_event.set()
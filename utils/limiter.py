@@ -0,0 +1,165 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Optional
+
+from exceptions import ChatDemoException
+
+
+class AdaptiveLimiter:
+    """
+    Caps concurrent calls to a backend, queueing a bounded number of callers for a bounded time.
+
+    With `adaptive` set, the limit follows AIMD: every call that finishes within `latency_target` grows the limit by
+    1/limit (about +1 per limit's worth of calls), and a slow call or overload error shrinks it by `backoff`. Callers
+    that find the queue full are rejected immediately with a 429, and callers that wait longer than `queue_timeout`
+    get a 503, both with a Retry-After hint.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        min_limit: int,
+        max_limit: int,
+        max_queue: int,
+        queue_timeout: float,
+        latency_target: float,
+        adaptive: bool = True,
+        backoff: float = 0.9,
+        is_overload: Optional[Callable[[BaseException], bool]] = None,
+    ):
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_target = latency_target
+        self.adaptive = adaptive
+        self.backoff = backoff
+        self.is_overload = is_overload or (lambda exc: True)
+
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.overloads = 0
+        self.queued = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.latency_ewma: Optional[float] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < max(1, math.floor(self.limit))
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.latency_ewma or 1))
+
+    async def acquire(self):
+        if self._has_capacity() and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise ChatDemoException(
+                "Too many requests, please retry later",
+                status_code=429,
+                headers={"Retry-After": str(self.retry_after())},
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise ChatDemoException(
+                "Upstream is busy, please retry later",
+                status_code=503,
+                headers={"Retry-After": str(self.retry_after())},
+            )
+        except asyncio.CancelledError:
+            # We may have been handed a slot just as we were cancelled, so pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            waited = time.monotonic() - started
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+
+        # release() already counted us as in flight when it handed over the slot
+        self.admitted += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def record(self, latency: float, overloaded: bool = False):
+        """
+        Feeds the outcome of a call into the latency average and, if adaptive, the limit
+        """
+        self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+        if overloaded:
+            self.overloads += 1
+
+        if not self.adaptive:
+            return
+        if overloaded or latency > self.latency_target:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake_waiters()
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Holds a slot for the duration of the block and records its latency and outcome. Cancellation (the caller
+        went away) is not recorded, as it says nothing about the backend.
+        """
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.record(time.monotonic() - started, overloaded=self.is_overload(e))
+            raise
+        else:
+            self.record(time.monotonic() - started)
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": math.floor(self.limit),
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "overloads": self.overloads,
+            "wait_time_total": self.wait_time_total,
+            "wait_time_max": self.wait_time_max,
+            "latency_ewma": self.latency_ewma,
+        }
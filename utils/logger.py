@@ -1,13 +1,109 @@
+import atexit
+import json
 import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from config import settings
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as compact one-line JSON, which CloudWatch Logs Insights can query by field
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(",", ":"), default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the records below WARNING from the given loggers (and their children), e.g.
+    {"httpx": 0.1}. Warnings and errors are always kept.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def _rate(self, name: str) -> Optional[float]:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return self.rates.get("root")
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate is None or random.random() < rate
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Queues records unformatted, so that %-style arguments are only interpolated on the listener thread rather than on
+    the event loop. The records are never pickled, so they don't need to be flattened first.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def build_formatter() -> logging.Formatter:
+    if settings.LOG_FORMAT.lower() == "json":
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+
 
 # Configure logging for Lambda environment
 logger = logging.getLogger()  # Get root logger instead of __name__
-logger.setLevel(logging.INFO)
+logger.setLevel(settings.LOG_LEVEL.upper())
 
 # Clear any existing handlers to avoid duplicate logs
 logger.handlers = []
 
-# Add stdout handler
+for name, level in settings.LOG_LEVELS.items():
+    logging.getLogger(name).setLevel(level.upper())
+
+# Add stdout handler, fed through a queue so that callers never block on the write
 handler = logging.StreamHandler()
-handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
-logger.addHandler(handler)
+handler.setFormatter(build_formatter())
+
+listener: Optional[QueueListener] = None
+if settings.LOG_QUEUE:
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    if settings.LOG_SAMPLING:
+        queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLING))
+    logger.addHandler(queue_handler)
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+else:
+    if settings.LOG_SAMPLING:
+        handler.addFilter(SamplingFilter(settings.LOG_SAMPLING))
+    logger.addHandler(handler)
+
+
+def flush_logs():
+    """
+    Waits until queued records have been written. Lambda may freeze the container as soon as the handler returns, so
+    call this before returning from it.
+    """
+    if listener is not None:
+        listener.queue.join()
+    handler.flush()
@@ -0,0 +1,301 @@
+import bisect
+import json
+import sys
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import settings
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+MetricKey = Tuple[str, Labels]
+
+
+class _Shard:
+    """
+    One thread's counters. Only its own thread writes to it, so recording takes no lock.
+    """
+
+    def __init__(self):
+        self.counters: Dict[MetricKey, float] = {}
+        self.histograms: Dict[MetricKey, List[float]] = {}
+
+    def merge(self, other: "_Shard"):
+        for key, value in list(other.counters.items()):
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, values in list(other.histograms.items()):
+            total = self.histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(list(values)):
+                total[i] += value
+
+
+class _ThreadToken:
+    """
+    Held only by a thread's local storage, so it is collected when the thread exits
+    """
+
+    __slots__ = ("__weakref__",)
+
+
+class Metrics:
+    """
+    Process-wide counters, gauges and latency histograms.
+
+    Every thread records into its own shard and a scrape sums the shards, so the hot path never waits on a lock.
+    When a thread exits, its shard is folded into a retired one, so short-lived threads (e.g. executor workers) don't
+    pile up shards.
+
+    Gauges are counters that also go down (e.g. requests in flight). Collectors registered with `register_collector`
+    add gauges read from existing stats at scrape time, e.g. pool or cache stats.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._retired = _Shard()
+        # Reentrant, as a shard may be retired by garbage collection while the lock is held
+        self._shards_lock = threading.RLock()
+        self._collectors: Dict[str, Callable[[], dict]] = {}
+        self._gauges = set()
+        self._last_emf: Optional[Tuple[dict, dict]] = None
+        self._last_emf_time = time.monotonic()
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = _Shard()
+            self._local.shard = shard
+            self._local.token = token = _ThreadToken()
+            # Only taken once per thread
+            with self._shards_lock:
+                self._shards.append(shard)
+            weakref.finalize(token, self._retire, shard)
+        return shard
+
+    def _retire(self, shard: _Shard):
+        # Its thread has exited, so nothing writes to the shard any more
+        with self._shards_lock:
+            self._retired.merge(shard)
+            self._shards.remove(shard)
+
+    def inc(self, name: str, labels: Optional[dict] = None, value: float = 1):
+        counters = self._shard().counters
+        key = (name, _labels(labels))
+        counters[key] = counters.get(key, 0) + value
+
+    def add(self, name: str, delta: float, labels: Optional[dict] = None):
+        """
+        Moves a gauge up or down
+        """
+        self._gauges.add(name)
+        self.inc(name, labels, delta)
+
+    def observe(self, name: str, value: float, labels: Optional[dict] = None):
+        histograms = self._shard().histograms
+        key = (name, _labels(labels))
+        histogram = histograms.get(key)
+        if histogram is None:
+            # One count per bucket, the overflow (+Inf) count, then the sum
+            histogram = histograms[key] = [0] * (len(self.buckets) + 2)
+        histogram[bisect.bisect_left(self.buckets, value)] += 1
+        histogram[-1] += value
+
+    @contextmanager
+    def timer(self, component: str):
+        """
+        Times a call to a backend ("upstream", "db", "s3", ...), counting it as an error if it raises
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("component_errors_total", {"component": component})
+            raise
+        finally:
+            self.observe("component_duration_seconds", time.perf_counter() - started, {"component": component})
+
+    def register_collector(self, prefix: str, collect: Callable[[], dict]):
+        self._collectors[prefix] = collect
+
+    def snapshot(self) -> Tuple[Dict[MetricKey, float], Dict[MetricKey, List[float]]]:
+        total = _Shard()
+        # Held throughout, so that a shard being retired is counted exactly once
+        with self._shards_lock:
+            total.merge(self._retired)
+            for shard in list(self._shards):
+                # merge() copies before iterating, as the owning thread may be adding keys
+                total.merge(shard)
+        return total.counters, total.histograms
+
+    def collect_stats(self) -> Dict[str, float]:
+        gauges = {}
+        for prefix, collect in self._collectors.items():
+            try:
+                _flatten(prefix, collect(), gauges)
+            except Exception:
+                continue
+        return gauges
+
+    def render_prometheus(self) -> str:
+        """
+        Renders all metrics in the Prometheus text exposition format
+        """
+        counters, histograms = self.snapshot()
+        lines = []
+
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {name} {'gauge' if name in self._gauges else 'counter'}")
+            for (key_name, labels), value in sorted(counters.items()):
+                if key_name == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (key_name, labels), values in sorted(histograms.items()):
+                if key_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), values):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {_format_value(cumulative)}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {values[-1]}")
+                lines.append(f"{name}_count{_format_labels(labels)} {_format_value(cumulative)}")
+
+        for name, value in sorted(self.collect_stats().items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def emit_emf(self, force: bool = False) -> bool:
+        """
+        Writes what was recorded since the last call as CloudWatch embedded metric format log lines, at most every
+        METRICS_EMF_INTERVAL seconds. Returns whether anything was written.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_emf_time < settings.METRICS_EMF_INTERVAL:
+            return False
+        self._last_emf_time = now
+
+        counters, histograms = self.snapshot()
+        previous_counters, previous_histograms = self._last_emf or ({}, {})
+        self._last_emf = (counters, histograms)
+
+        documents = []
+        for (name, labels), value in counters.items():
+            delta = value - previous_counters.get((name, labels), 0)
+            if name not in self._gauges and delta:
+                documents.append(self._emf_document(name, labels, "Count", delta))
+
+        for (name, labels), values in histograms.items():
+            previous = previous_histograms.get((name, labels), [0] * len(values))
+            counts = [current - before for current, before in zip(values[:-1], previous[:-1])]
+            # EMF takes a distribution as values with counts. Each bucket is reported at its upper bound, with the
+            # overflow bucket folded into the last one.
+            overflow = counts.pop()
+            counts[-1] += overflow
+            if any(counts):
+                distribution = {
+                    "Values": [bound for bound, count in zip(self.buckets, counts) if count],
+                    "Counts": [count for count in counts if count],
+                }
+                documents.append(self._emf_document(name, labels, "Seconds", distribution))
+
+        if documents:
+            # EMF lines must be bare JSON, so they bypass the log formatter
+            sys.stdout.write("".join(json.dumps(document, separators=(",", ":")) + "\n" for document in documents))
+            sys.stdout.flush()
+        return bool(documents)
+
+    @staticmethod
+    def _emf_document(name: str, labels: Labels, unit: str, value) -> dict:
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": settings.METRICS_NAMESPACE,
+                        "Dimensions": [[key for key, _ in labels]],
+                        "Metrics": [{"Name": name, "Unit": unit}],
+                    }
+                ],
+            },
+            **dict(labels),
+            name: value,
+        }
+
+
+class MetricsMiddleware:
+    """
+    Records request counts, latency and errors per route, and requests in flight. Routes are labelled by their
+    template (e.g. /api/v1/chat/conversations/{conversation_id}) so that labels stay bounded.
+    """
+
+    def __init__(self, app, registry: Optional[Metrics] = None):
+        self.app = app
+        self.metrics = registry or metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        self.metrics.add("http_requests_in_flight", 1)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.metrics.add("http_requests_in_flight", -1)
+            route = scope.get("route")
+            labels = {"method": scope["method"], "route": getattr(route, "path", "unmatched")}
+            self.metrics.observe("http_request_duration_seconds", time.perf_counter() - started, labels)
+            self.metrics.inc("http_requests_total", dict(labels, status=str(status_code)))
+            if status_code >= 500:
+                self.metrics.inc("http_request_errors_total", labels)
+
+
+def _labels(labels: Optional[dict]) -> Labels:
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _flatten(prefix: str, stats: dict, gauges: Dict[str, float]):
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            _flatten(name, value, gauges)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            gauges[name] = value
+        elif isinstance(value, bool):
+            gauges[name] = int(value)
+
+
+metrics = Metrics()
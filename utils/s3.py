@@ -1,19 +1,64 @@
-import boto3
+import asyncio
+import datetime
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterable,
+    BinaryIO,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from botocore.exceptions import ClientError
+
 from config import settings
+from utils.aws import get_client
+from utils.cache import TTLCache
+from utils.deadline import ensure_time_left
 from utils.logger import logger
+from utils.metrics import metrics
+
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+
+# S3 rejects multipart parts smaller than this, except for the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def get_transfer_config(part_size: Optional[int] = None, max_concurrency: Optional[int] = None) -> "TransferConfig":
+    """
+    Transfer settings for managed uploads and downloads, which switch to parallel multipart/ranged transfers above
+    the multipart threshold
+    """
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+        multipart_chunksize=part_size or settings.S3_MULTIPART_CHUNKSIZE,
+        max_concurrency=max_concurrency or settings.S3_MAX_CONCURRENCY,
+    )
 
 
 def download_file(bucket_name: str, file_name: str, local_file_path: str) -> bool:
     """
     Downloads a file from an S3 bucket
     """
-    # Create an S3 client
-    boto_session = boto3.session.Session(profile_name=settings.AWS_PROFILE)
-    s3 = boto_session.client("s3")
+    s3 = get_client("s3")
 
     # Download the file
     try:
-        s3.download_file(bucket_name, file_name, local_file_path)
+        ensure_time_left("S3 download")
+        s3.download_file(bucket_name, file_name, local_file_path, Config=get_transfer_config())
     except Exception as e:
         logger.error(f"Error downloading file from S3: {str(e)}")
         return False
@@ -25,9 +70,7 @@ def upload_file(file_binary: bytes, bucket_name: str, file_name: str) -> bool:
     """
     Uploads a file to an S3 bucket
     """
-    # Create an S3 client
-    boto_session = boto3.session.Session(profile_name=settings.AWS_PROFILE)
-    s3 = boto_session.client("s3")
+    s3 = get_client("s3")
 
     # Upload the file
     try:
@@ -39,13 +82,276 @@ def upload_file(file_binary: bytes, bucket_name: str, file_name: str) -> bool:
     return True
 
 
+def upload_fileobj(
+    fileobj: BinaryIO,
+    bucket_name: str,
+    file_name: str,
+    content_type: Optional[str] = None,
+    part_size: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+) -> bool:
+    """
+    Uploads a file-like object to an S3 bucket without reading it into memory. Large files are uploaded as parallel
+    multipart uploads, which are aborted if they fail.
+    """
+    s3 = get_client("s3")
+    extra_args = {"ContentType": content_type} if content_type else None
+
+    try:
+        ensure_time_left("S3 upload")
+        s3.upload_fileobj(
+            fileobj,
+            bucket_name,
+            file_name,
+            ExtraArgs=extra_args,
+            Config=get_transfer_config(part_size, max_concurrency),
+        )
+    except Exception as e:
+        logger.error(f"Error uploading file to S3: {str(e)}")
+        return False
+
+    return True
+
+
+class MultipartUpload:
+    """
+    A multipart upload whose parts are uploaded as they are produced. Used by `upload_stream` and
+    `upload_async_stream`; call `abort` if anything fails so S3 doesn't keep the orphaned parts.
+    """
+
+    def __init__(self, bucket_name: str, file_name: str, content_type: Optional[str] = None):
+        self.bucket_name = bucket_name
+        self.file_name = file_name
+        self.content_type = content_type
+        self.upload_id: Optional[str] = None
+        self.parts: List[dict] = []
+        self.aborted = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        s3 = get_client("s3")
+        params = {"Bucket": self.bucket_name, "Key": self.file_name}
+        if self.content_type:
+            params["ContentType"] = self.content_type
+        upload_id = s3.create_multipart_upload(**params)["UploadId"]
+        with self._lock:
+            self.upload_id = upload_id
+            aborted = self.aborted
+        # Aborted while starting, e.g. the async upload was cancelled while this ran in its thread
+        if aborted:
+            abort_multipart_upload(self.bucket_name, self.file_name, upload_id)
+
+    def upload_part(self, part_number: int, data: bytes) -> dict:
+        s3 = get_client("s3")
+        response = s3.upload_part(
+            Bucket=self.bucket_name, Key=self.file_name, UploadId=self.upload_id, PartNumber=part_number, Body=data
+        )
+        part = {"PartNumber": part_number, "ETag": response["ETag"]}
+        self.parts.append(part)
+        return part
+
+    def complete(self):
+        s3 = get_client("s3")
+        s3.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=self.file_name,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": sorted(self.parts, key=lambda part: part["PartNumber"])},
+        )
+
+    def abort(self):
+        with self._lock:
+            self.aborted = True
+            upload_id = self.upload_id
+        if upload_id is not None:
+            abort_multipart_upload(self.bucket_name, self.file_name, upload_id)
+
+
+def _put_single(data: bytes, bucket_name: str, file_name: str, content_type: Optional[str]):
+    params = {"Bucket": bucket_name, "Key": file_name, "Body": data}
+    if content_type:
+        params["ContentType"] = content_type
+    get_client("s3").put_object(**params)
+
+
+def _iter_parts(chunks: Iterable[bytes], part_size: int) -> Iterable[bytes]:
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= part_size:
+            yield bytes(buffer[:part_size])
+            del buffer[:part_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+def upload_stream(
+    chunks: Iterable[bytes],
+    bucket_name: str,
+    file_name: str,
+    content_type: Optional[str] = None,
+    part_size: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+) -> bool:
+    """
+    Uploads an iterable of byte chunks to an S3 bucket as a multipart upload, uploading up to `max_concurrency` parts
+    at a time. At most about (max_concurrency + 1) * part_size bytes are held in memory. Streams that fit in a single
+    part are uploaded with one put_object.
+    """
+    part_size = max(part_size or settings.S3_MULTIPART_CHUNKSIZE, MIN_PART_SIZE)
+    max_concurrency = max_concurrency or settings.S3_MAX_CONCURRENCY
+    upload = MultipartUpload(bucket_name, file_name, content_type)
+
+    try:
+        parts = iter(_iter_parts(chunks, part_size))
+        first = next(parts, b"")
+        second = next(parts, None)
+        if second is None:
+            _put_single(first, bucket_name, file_name, content_type)
+            return True
+
+        upload.start()
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            pending = {executor.submit(upload.upload_part, 1, first), executor.submit(upload.upload_part, 2, second)}
+            for part_number, data in enumerate(parts, start=3):
+                # Give up (and abort the upload) rather than outlive the request
+                ensure_time_left("S3 upload")
+                # Wait for a free slot before reading more, which bounds memory use
+                while len(pending) >= max_concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                pending.add(executor.submit(upload.upload_part, part_number, data))
+            for future in pending:
+                future.result()
+        upload.complete()
+    except Exception as e:
+        logger.error(f"Error uploading stream to S3: {str(e)}")
+        upload.abort()
+        return False
+
+    return True
+
+
+async def upload_async_stream(
+    chunks: AsyncIterable[bytes],
+    bucket_name: str,
+    file_name: str,
+    content_type: Optional[str] = None,
+    part_size: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+) -> bool:
+    """
+    Async version of `upload_stream` for async iterators. The blocking S3 calls run in worker threads.
+    """
+    part_size = max(part_size or settings.S3_MULTIPART_CHUNKSIZE, MIN_PART_SIZE)
+    max_concurrency = max_concurrency or settings.S3_MAX_CONCURRENCY
+    upload = MultipartUpload(bucket_name, file_name, content_type)
+    pending = set()
+
+    try:
+        buffer = bytearray()
+        part_number = 0
+
+        async def send_part(data: bytes):
+            nonlocal part_number, pending
+            ensure_time_left("S3 upload")
+            if part_number == 0:
+                await asyncio.to_thread(upload.start)
+            part_number += 1
+            while len(pending) >= max_concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            pending.add(asyncio.ensure_future(asyncio.to_thread(upload.upload_part, part_number, data)))
+
+        async for chunk in chunks:
+            buffer += chunk
+            # Keep a full part back so the last part is never empty and small streams can use a single put_object
+            while len(buffer) >= 2 * part_size:
+                await send_part(bytes(buffer[:part_size]))
+                del buffer[:part_size]
+
+        if part_number == 0 and len(buffer) <= part_size:
+            await asyncio.to_thread(_put_single, bytes(buffer), bucket_name, file_name, content_type)
+            return True
+
+        while buffer:
+            await send_part(bytes(buffer[:part_size]))
+            del buffer[:part_size]
+        for task in pending:
+            await task
+        await asyncio.to_thread(upload.complete)
+    except BaseException as e:
+        # Also on cancellation (e.g. the client disconnected or the deadline passed), after which the upload is
+        # still aborted, shielded from a further cancellation, before CancelledError is raised again
+        for task in pending:
+            task.cancel()
+        await asyncio.shield(asyncio.to_thread(upload.abort))
+        if not isinstance(e, Exception):
+            raise
+        logger.error(f"Error uploading stream to S3: {str(e)}")
+        return False
+
+    return True
+
+
+def download_fileobj(
+    bucket_name: str,
+    file_name: str,
+    fileobj: BinaryIO,
+    part_size: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+) -> bool:
+    """
+    Downloads a file from an S3 bucket into a file-like object (e.g. an open file or BytesIO). Large files are
+    fetched as parallel ranged GETs.
+    """
+    s3 = get_client("s3")
+
+    try:
+        ensure_time_left("S3 download")
+        s3.download_fileobj(bucket_name, file_name, fileobj, Config=get_transfer_config(part_size, max_concurrency))
+    except Exception as e:
+        logger.error(f"Error downloading file from S3: {str(e)}")
+        return False
+
+    return True
+
+
+def download_range(bucket_name: str, file_name: str, start: int, end: Optional[int] = None) -> Optional[bytes]:
+    """
+    Downloads bytes `start` to `end` (inclusive, or to the end of the file) of a file in an S3 bucket
+    """
+    s3 = get_client("s3")
+    byte_range = f"bytes={start}-{end if end is not None else ''}"
+
+    try:
+        response = s3.get_object(Bucket=bucket_name, Key=file_name, Range=byte_range)
+        return response["Body"].read()
+    except Exception as e:
+        logger.error(f"Error downloading file range from S3: {str(e)}")
+        return None
+
+
+def iter_file(bucket_name: str, file_name: str, chunk_size: int = 1024 * 1024) -> Iterable[bytes]:
+    """
+    Streams a file from an S3 bucket in chunks. Unlike the other helpers, errors are raised, since a partially
+    consumed stream can't be reported as a simple failure.
+    """
+    s3 = get_client("s3")
+    body = s3.get_object(Bucket=bucket_name, Key=file_name)["Body"]
+    try:
+        yield from body.iter_chunks(chunk_size)
+    finally:
+        body.close()
+
+
 def delete_file(bucket_name: str, file_name: str) -> bool:
     """
     Deletes a file from an S3 bucket
     """
-    # Create an S3 client
-    boto_session = boto3.session.Session(profile_name=settings.AWS_PROFILE)
-    s3 = boto_session.client("s3")
+    s3 = get_client("s3")
 
     # Delete the file
     try:
@@ -61,9 +367,7 @@ def copy_file(source_bucket: str, source_key: str, destination_bucket: str, dest
     """
     Copies a file from one S3 bucket to another
     """
-    # Create an S3 client
-    boto_session = boto3.session.Session(profile_name=settings.AWS_PROFILE)
-    s3 = boto_session.client("s3")
+    s3 = get_client("s3")
 
     # Copy the file
     try:
@@ -79,27 +383,25 @@ def copy_file(source_bucket: str, source_key: str, destination_bucket: str, dest
     return True
 
 
-def get_signed_url(bucket_name: str, file_key: str, expiration: int = 60, filename: str = None) -> str:
-    """
-    Generates a presigned URL for a file in an S3 bucket
-    """
-    # Create an S3 client
-    boto_session = boto3.session.Session(profile_name=settings.AWS_PROFILE)
-    s3 = boto_session.client("s3")
+signed_url_cache = TTLCache(max_entries=settings.S3_SIGNED_URL_CACHE_SIZE, ttl=0)
+metrics.register_collector("s3_signed_url_cache", signed_url_cache.stats)
 
-    params = {
-        "Bucket": bucket_name,
-        "Key": file_key,
-    }
 
-    # Add content disposition if filename is provided
-    if filename:
-        params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
+def _presign(client_method: str, params: dict, expiration: int, use_cache: bool) -> str:
+    """
+    Presigns a request, reusing a previously signed URL for the same request while it still has at least
+    S3_SIGNED_URL_SAFETY_MARGIN seconds of validity left
+    """
+    cache_key = (client_method, expiration, _freeze(params))
+    if use_cache:
+        url = signed_url_cache.get(cache_key)
+        if url is not None:
+            return url
 
-    # Generate the presigned URL
+    s3 = get_client("s3")
     try:
         url = s3.generate_presigned_url(
-            ClientMethod="get_object",
+            ClientMethod=client_method,
             Params=params,
             ExpiresIn=expiration,
         )
@@ -107,51 +409,192 @@ def get_signed_url(bucket_name: str, file_key: str, expiration: int = 60, filena
         logger.error(f"Error generating presigned URL for file in S3: {str(e)}")
         return ""
 
+    if use_cache:
+        # Expirations at or below the margin give a TTL <= 0, which the cache ignores
+        signed_url_cache.set(cache_key, url, ttl=expiration - settings.S3_SIGNED_URL_SAFETY_MARGIN)
     return url
 
 
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def get_signed_url(
+    bucket_name: str, file_key: str, expiration: int = 60, filename: str = None, use_cache: bool = True
+) -> str:
+    """
+    Generates a presigned URL for a file in an S3 bucket
+    """
+    params = {
+        "Bucket": bucket_name,
+        "Key": file_key,
+    }
+
+    # Add content disposition if filename is provided
+    if filename:
+        params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
+
+    return _presign("get_object", params, expiration, use_cache)
+
+
 def get_signed_upload_url(
     bucket_name: str,
     file_key: str,
     content_type: str,
     expiration: int = 60,
     cognito_id: str = None,
+    use_cache: bool = True,
 ) -> str:
     """
     Generates a presigned URL for a file in an S3 bucket
     """
-    # Create an S3 client
-    boto_session = boto3.session.Session(profile_name=settings.AWS_PROFILE)
-    s3 = boto_session.client("s3")
+    params = {"Bucket": bucket_name, "Key": file_key, "ContentType": content_type}
+    # botocore fails on None metadata values
+    if cognito_id:
+        params["Metadata"] = {"cognito_id": cognito_id}
 
-    params = {
-        "Bucket": bucket_name,
-        "Key": file_key,
-        "ContentType": content_type,
-        "Metadata": {"cognito_id": cognito_id},
-    }
+    return _presign("put_object", params, expiration, use_cache)
+
+
+# S3 limits for multipart uploads
+MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+def plan_parts(file_size: int, part_size: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Picks the part size and part count for uploading `file_size` bytes, growing the part size if needed to stay
+    within S3's part count limit
+    """
+    part_size = max(part_size or settings.S3_MULTIPART_CHUNKSIZE, MIN_PART_SIZE, -(-file_size // MAX_PARTS))
+    if part_size > MAX_PART_SIZE:
+        raise ValueError(f"File of {file_size} bytes is too large for a multipart upload")
+    return part_size, max(1, -(-file_size // part_size))
 
-    # Generate the presigned URL
+
+def create_signed_multipart_upload(
+    bucket_name: str, file_key: str, content_type: str, cognito_id: str = None
+) -> Optional[str]:
+    """
+    Starts a multipart upload that the client will upload parts to with presigned URLs. Returns the upload ID.
+    """
+    s3 = get_client("s3")
+    params = {"Bucket": bucket_name, "Key": file_key, "ContentType": content_type}
+    if cognito_id:
+        params["Metadata"] = {"cognito_id": cognito_id}
     try:
-        url = s3.generate_presigned_url(
-            ClientMethod="put_object",
-            Params=params,
-            ExpiresIn=expiration,
+        response = s3.create_multipart_upload(**params)
+    except Exception as e:
+        logger.error(f"Error creating multipart upload in S3: {str(e)}")
+        return None
+
+    return response["UploadId"]
+
+
+def get_signed_part_urls(
+    bucket_name: str, file_key: str, upload_id: str, part_numbers: Iterable[int], expiration: int = None
+) -> Dict[int, str]:
+    """
+    Generates presigned `upload_part` URLs for a multipart upload, one per part number. Signing is local, so a
+    client can ask for all of its parts in one call, or only the missing ones when resuming. Part URLs are never
+    reused, so they bypass the signed URL cache rather than evicting the URLs it is there for.
+    """
+    expiration = expiration or settings.S3_MULTIPART_URL_EXPIRATION
+    urls = {}
+    for part_number in part_numbers:
+        if not 1 <= part_number <= MAX_PARTS:
+            raise ValueError(f"Part numbers must be between 1 and {MAX_PARTS}")
+        params = {"Bucket": bucket_name, "Key": file_key, "UploadId": upload_id, "PartNumber": part_number}
+        url = _presign("upload_part", params, expiration, use_cache=False)
+        if not url:
+            return {}
+        urls[part_number] = url
+
+    return urls
+
+
+def list_uploaded_parts(bucket_name: str, file_key: str, upload_id: str) -> Optional[List[dict]]:
+    """
+    Lists the parts uploaded so far as `{"PartNumber", "ETag", "Size"}`, e.g. to resume an interrupted upload
+    """
+    s3 = get_client("s3")
+    try:
+        pages = s3.get_paginator("list_parts").paginate(Bucket=bucket_name, Key=file_key, UploadId=upload_id)
+        return [
+            {"PartNumber": part["PartNumber"], "ETag": part["ETag"], "Size": part["Size"]}
+            for page in pages
+            for part in page.get("Parts", [])
+        ]
+    except Exception as e:
+        logger.error(f"Error listing multipart upload parts in S3: {str(e)}")
+        return None
+
+
+def complete_signed_multipart_upload(bucket_name: str, file_key: str, upload_id: str, parts: List[dict]) -> bool:
+    """
+    Completes a multipart upload from the `{"PartNumber", "ETag"}` pairs the client got back for its parts
+    """
+    parts = sorted(({"PartNumber": p["PartNumber"], "ETag": p["ETag"]} for p in parts), key=lambda p: p["PartNumber"])
+    if not parts or len({part["PartNumber"] for part in parts}) != len(parts):
+        logger.error("Error completing multipart upload in S3: parts must be non-empty and unique")
+        return False
+
+    s3 = get_client("s3")
+    try:
+        s3.complete_multipart_upload(
+            Bucket=bucket_name, Key=file_key, UploadId=upload_id, MultipartUpload={"Parts": parts}
         )
     except Exception as e:
-        logger.error(f"Error generating presigned URL for file in S3: {str(e)}")
-        return ""
+        logger.error(f"Error completing multipart upload in S3: {str(e)}")
+        return False
 
-    return url
+    return True
+
+
+def abort_multipart_upload(bucket_name: str, file_key: str, upload_id: str) -> bool:
+    """
+    Aborts a multipart upload and deletes its uploaded parts
+    """
+    s3 = get_client("s3")
+    try:
+        s3.abort_multipart_upload(Bucket=bucket_name, Key=file_key, UploadId=upload_id)
+    except Exception as e:
+        logger.error(f"Error aborting multipart upload to S3: {str(e)}")
+        return False
+
+    return True
+
+
+def abort_stale_multipart_uploads(bucket_name: str, prefix: str = "", max_age: int = None) -> int:
+    """
+    Aborts multipart uploads started more than `max_age` seconds ago, which clients abandoned without completing or
+    aborting. Their parts are billed until then. Returns the number of uploads aborted.
+    """
+    max_age = settings.S3_STALE_UPLOAD_AGE if max_age is None else max_age
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=max_age)
+    s3 = get_client("s3")
+
+    aborted = 0
+    try:
+        for page in s3.get_paginator("list_multipart_uploads").paginate(Bucket=bucket_name, Prefix=prefix):
+            for upload in page.get("Uploads", []):
+                if upload["Initiated"] < cutoff and abort_multipart_upload(
+                    bucket_name, upload["Key"], upload["UploadId"]
+                ):
+                    aborted += 1
+    except Exception as e:
+        logger.error(f"Error listing multipart uploads in S3: {str(e)}")
+
+    return aborted
 
 
 def get_file_metadata(bucket_name: str, file_key: str) -> dict:
     """
     Gets the metadata for a file in an S3 bucket
     """
-    # Create an S3 client
-    boto_session = boto3.session.Session(profile_name=settings.AWS_PROFILE)
-    s3 = boto_session.client("s3")
+    s3 = get_client("s3")
 
     # Get the file metadata
     try:
@@ -163,16 +606,118 @@ def get_file_metadata(bucket_name: str, file_key: str) -> dict:
     return metadata
 
 
-def get_all_files_in_bucket(bucket_name: str) -> list:
+class S3Object(NamedTuple):
+    key: str
+    size: int
+    etag: str
+    last_modified: datetime.datetime
+
+
+def _iter_list_pages(bucket_name: str, prefix: str = "", delimiter: Optional[str] = None, page_size: int = 1000):
+    s3 = get_client("s3")
+    params = {"Bucket": bucket_name, "Prefix": prefix, "PaginationConfig": {"PageSize": page_size}}
+    if delimiter:
+        params["Delimiter"] = delimiter
+    yield from s3.get_paginator("list_objects_v2").paginate(**params)
+
+
+def iter_files(
+    bucket_name: str, prefix: str = "", delimiter: Optional[str] = None, page_size: int = 1000
+) -> Iterator[S3Object]:
+    """
+    Lazily lists the files in an S3 bucket under `prefix`, fetching one page at a time. With a `delimiter`, only
+    files directly under the prefix are listed (see `iter_prefixes` for the "subdirectories"). Errors are raised
+    rather than logged, so that a failed listing can't be mistaken for a short one.
+    """
+    for page in _iter_list_pages(bucket_name, prefix, delimiter, page_size):
+        for obj in page.get("Contents", []):
+            yield S3Object(obj["Key"], obj["Size"], obj["ETag"].strip('"'), obj["LastModified"])
+
+
+def iter_prefixes(bucket_name: str, prefix: str = "", delimiter: str = "/") -> Iterator[str]:
+    """
+    Lazily lists the common prefixes ("subdirectories") directly under `prefix`
+    """
+    for page in _iter_list_pages(bucket_name, prefix, delimiter):
+        for common_prefix in page.get("CommonPrefixes", []):
+            yield common_prefix["Prefix"]
+
+
+def iter_files_concurrently(
+    bucket_name: str, prefixes: Iterable[str], max_workers: Optional[int] = None, buffer_pages: int = 4
+) -> Iterator[S3Object]:
+    """
+    Lists several prefixes in parallel and yields their files as pages arrive, in no particular order. At most
+    `buffer_pages` pages are buffered ahead of the consumer.
+
+    Only files under the given prefixes are listed: splitting a listing by `iter_prefixes` misses the files directly
+    under the root prefix, which `iter_all_files_concurrently` lists as well.
+    """
+    prefixes = list(prefixes)
+    pages: queue.Queue = queue.Queue(maxsize=buffer_pages)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # Give up once the consumer has gone away, rather than blocking on a full queue forever
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def list_prefix(prefix: str):
+        try:
+            for page in _iter_list_pages(bucket_name, prefix):
+                if stop.is_set():
+                    return
+                put(page.get("Contents", []))
+        except Exception as e:
+            put(e)
+        finally:
+            put(done)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers or settings.S3_MAX_CONCURRENCY)
+    try:
+        for prefix in prefixes:
+            executor.submit(list_prefix, prefix)
+
+        remaining = len(prefixes)
+        while remaining:
+            item = pages.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                for obj in item:
+                    yield S3Object(obj["Key"], obj["Size"], obj["ETag"].strip('"'), obj["LastModified"])
+    finally:
+        # Stop the workers if the consumer stopped early
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_all_files_concurrently(
+    bucket_name: str, prefix: str = "", delimiter: str = "/", max_workers: Optional[int] = None
+) -> Iterator[S3Object]:
     """
-    Gets all the files in an S3 bucket
+    Lists every file under `prefix`, much faster than one sequential listing for large buckets: the files directly
+    under `prefix` are listed first, then its "subdirectories" in parallel with `iter_files_concurrently`.
     """
-    # Create an S3 client
-    boto_session = boto3.session.Session(profile_name=settings.AWS_PROFILE)
-    s3 = boto_session.client("s3")
+    yield from iter_files(bucket_name, prefix, delimiter=delimiter)
+    yield from iter_files_concurrently(
+        bucket_name, iter_prefixes(bucket_name, prefix, delimiter), max_workers=max_workers
+    )
+
 
+def get_all_files_in_bucket(bucket_name: str) -> list:
+    """
+    Gets all the files in an S3 bucket, as the raw boto3 dicts. Prefer `iter_files` for large buckets.
+    """
     try:
-        files = s3.list_objects_v2(Bucket=bucket_name)["Contents"]
+        files = [obj for page in _iter_list_pages(bucket_name) for obj in page.get("Contents", [])]
     except Exception as e:
         logger.error(f"Error getting all files in S3 bucket: {str(e)}")
         return []
@@ -180,8 +725,119 @@ def get_all_files_in_bucket(bucket_name: str) -> list:
     return files
 
 
+def _head_object(bucket_name: str, file_key: str) -> Optional[dict]:
+    """
+    Returns the object's metadata, or None if it doesn't exist. Other errors are raised.
+    """
+    s3 = get_client("s3")
+    try:
+        return s3.head_object(Bucket=bucket_name, Key=file_key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+
 def file_exists(bucket_name: str, file_key: str) -> bool:
     """
-    Checks if a file exists in an S3 bucket
+    Checks if a file exists in an S3 bucket. Unlike the other helpers, errors other than "not found" (e.g. access
+    denied or throttling) are raised, so that a failed check isn't mistaken for a missing file.
     """
-    return get_file_metadata(bucket_name, file_key) is not None
+    return _head_object(bucket_name, file_key) is not None
+
+
+@dataclass
+class S3BatchResult:
+    """
+    Per-key outcome of a batch operation: `results` for the keys that succeeded, `errors` for those that failed
+    """
+
+    results: Dict[Hashable, Any] = field(default_factory=dict)
+    errors: Dict[Hashable, str] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+# delete_objects accepts at most this many keys per request
+DELETE_BATCH_SIZE = 1000
+
+
+def delete_files(bucket_name: str, file_keys: Iterable[str]) -> S3BatchResult:
+    """
+    Deletes many files from an S3 bucket, 1,000 keys per request
+    """
+    s3 = get_client("s3")
+    result = S3BatchResult()
+    file_keys = list(dict.fromkeys(file_keys))
+
+    for start in range(0, len(file_keys), DELETE_BATCH_SIZE):
+        chunk = file_keys[start : start + DELETE_BATCH_SIZE]
+        try:
+            response = s3.delete_objects(
+                Bucket=bucket_name, Delete={"Objects": [{"Key": key} for key in chunk], "Quiet": True}
+            )
+        except Exception as e:
+            logger.error(f"Error deleting files from S3: {str(e)}")
+            result.errors.update((key, str(e)) for key in chunk)
+            continue
+
+        # In quiet mode only failures are reported
+        failed = {error["Key"]: f"{error.get('Code')}: {error.get('Message')}" for error in response.get("Errors", [])}
+        result.errors.update(failed)
+        result.results.update((key, True) for key in chunk if key not in failed)
+
+    return result
+
+
+def _run_batch(func, items: Iterable, key_func, max_workers: Optional[int]) -> S3BatchResult:
+    result = S3BatchResult()
+    items = list(items)
+    if not items:
+        return result
+
+    with ThreadPoolExecutor(max_workers=min(max_workers or settings.S3_BATCH_MAX_WORKERS, len(items))) as executor:
+        futures = {executor.submit(func, item): key_func(item) for item in items}
+        for future, key in futures.items():
+            try:
+                result.results[key] = future.result()
+            except Exception as e:
+                result.errors[key] = str(e)
+
+    if result.errors:
+        logger.error(f"{len(result.errors)} of {len(items)} S3 batch operations failed")
+    return result
+
+
+def get_files_metadata(bucket_name: str, file_keys: Iterable[str], max_workers: Optional[int] = None) -> S3BatchResult:
+    """
+    Gets the metadata of many files in parallel. Missing files map to None.
+    """
+    return _run_batch(lambda key: _head_object(bucket_name, key), file_keys, lambda key: key, max_workers)
+
+
+def files_exist(bucket_name: str, file_keys: Iterable[str], max_workers: Optional[int] = None) -> S3BatchResult:
+    """
+    Checks whether many files exist in parallel
+    """
+    return _run_batch(lambda key: _head_object(bucket_name, key) is not None, file_keys, lambda key: key, max_workers)
+
+
+def copy_files(copies: Iterable[Tuple[str, str, str, str]], max_workers: Optional[int] = None) -> S3BatchResult:
+    """
+    Copies many files in parallel. Takes (source_bucket, source_key, destination_bucket, destination_key) tuples and
+    reports results by (destination_bucket, destination_key).
+    """
+    s3 = get_client("s3")
+
+    def copy(item):
+        source_bucket, source_key, destination_bucket, destination_key = item
+        s3.copy_object(
+            Bucket=destination_bucket,
+            CopySource={"Bucket": source_bucket, "Key": source_key},
+            Key=destination_key,
+        )
+        return True
+
+    return _run_batch(copy, copies, lambda item: (item[2], item[3]), max_workers)
@@ -0,0 +1,136 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from config import settings
+from utils.aws import get_client
+from utils.logger import logger
+from utils.metrics import metrics
+
+SecretKey = Tuple[str, str]
+
+
+def fetch_secret(secret_name: str, region_name: str) -> str:
+    """
+    Reads a secret from Secrets Manager, bypassing the cache
+    """
+    client = get_client("secretsmanager", region_name=region_name)
+    # Decrypts secret using the associated KMS key.
+    return client.get_secret_value(SecretId=secret_name)["SecretString"]
+
+
+class SecretsCache:
+    """
+    In-process cache of Secrets Manager values.
+
+    A value is fresh for `ttl` seconds. For `stale_ttl` seconds after that it is still returned, while one background
+    thread fetches a new value; if that refresh fails the stale value keeps being served until it runs out. Fetches of
+    the same secret are serialized by a per-secret lock, so an expiry never sends more than one request per secret.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float, fetch: Callable[[str, str], str] = fetch_secret):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.fetch = fetch
+        self._entries: Dict[SecretKey, Tuple[str, float]] = {}
+        self._locks: Dict[SecretKey, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def _lock_for(self, key: SecretKey) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, secret_name: str, region_name: str) -> str:
+        key = (secret_name, region_name)
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._refresh_in_background(key)
+                return value
+
+        lock = self._lock_for(key)
+        with lock:
+            # Another thread may have fetched it while we waited for the lock
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return self._load(key)
+
+    def _load(self, key: SecretKey) -> str:
+        value = self.fetch(*key)
+        self._entries[key] = (value, time.monotonic())
+        return value
+
+    def _refresh_in_background(self, key: SecretKey):
+        lock = self._lock_for(key)
+        if not lock.acquire(blocking=False):
+            # Already being fetched
+            return
+
+        def refresh():
+            try:
+                self._load(key)
+                self.refreshes += 1
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.error(f"Error refreshing secret {key[0]}: {str(e)}")
+            finally:
+                lock.release()
+
+        threading.Thread(target=refresh, name=f"secret-refresh-{key[0]}", daemon=True).start()
+
+    def preload(self, secret_names: Iterable[str], region_name: str) -> int:
+        """
+        Fetches secrets concurrently, e.g. at container start so that requests don't pay for them. Failures are
+        logged and left to be retried on first use. Returns the number of secrets loaded.
+        """
+        secret_names = list(secret_names)
+        if not secret_names:
+            return 0
+
+        def load(secret_name: str) -> bool:
+            try:
+                self.get(secret_name, region_name)
+                return True
+            except Exception as e:
+                logger.error(f"Error preloading secret {secret_name}: {str(e)}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=min(len(secret_names), settings.SECRETS_PRELOAD_CONCURRENCY)) as executor:
+            return sum(executor.map(load, secret_names))
+
+    def invalidate(self, secret_name: str, region_name: Optional[str] = None):
+        for key in [key for key in self._entries if key[0] == secret_name and region_name in (None, key[1])]:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+        }
+
+
+secrets_cache = SecretsCache(ttl=settings.SECRETS_CACHE_TTL, stale_ttl=settings.SECRETS_STALE_TTL)
+metrics.register_collector("secrets_cache", secrets_cache.stats)
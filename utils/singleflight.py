@@ -0,0 +1,55 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller starts `fn` in its own task and every concurrent caller with the same key awaits that task. The
+    task is not owned by any one caller: if a caller is cancelled (e.g. its client disconnected) the others keep
+    waiting, and the task is only cancelled once nobody is waiting for it. The key is released as soon as the call
+    finishes, so later callers start a fresh call.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._release(key, call))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Release the key now rather than in the done callback, which only runs on a later loop iteration,
+                # so that a caller arriving in between starts a fresh call instead of joining the cancelled one
+                self._release(key, call)
+                call.task.cancel()
+
+    def _release(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), "calls": self.calls, "coalesced": self.coalesced}
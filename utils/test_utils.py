@@ -1,13 +1,16 @@
 """Helper utilities for testing."""
 
-from database import db_session, init_db, drop_db
+import database
+from database import init_engine, init_db, drop_db
 from sqlalchemy.orm.session import close_all_sessions
 
 
 class BaseTestCase:
     def setup_method(self):
+        if database.engine is None:
+            init_engine()
         init_db()
-        self.session = db_session
+        self.session = database.SessionLocal()
 
     def teardown_method(self):
         self.session.rollback()
@@ -0,0 +1,99 @@
+"""
+Tests for the streaming zip archives, run against the in-memory S3 fake
+"""
+
+import io
+import json
+import os
+import zipfile
+
+from constants import FileType
+from utils import archive, s3
+from utils.job_queue import job_handlers
+from utils.tests.test_s3 import PART_SIZE, FakeS3TestCase
+
+
+def test_iter_zip_streams_a_readable_archive():
+    entries = [("a.txt", [b"hello ", b"world"]), ("dir/b.bin", iter([b"\x00" * 1000] * 5)), ("empty", [])]
+    data = b"".join(archive.iter_zip(entries))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.namelist() == ["a.txt", "dir/b.bin", "empty"]
+        assert zf.read("a.txt") == b"hello world"
+        assert zf.read("dir/b.bin") == b"\x00" * 5000
+        assert zf.read("empty") == b""
+        assert zf.testzip() is None
+
+
+def test_iter_zip_is_lazy():
+    consumed = []
+
+    def chunks():
+        for i in range(3):
+            consumed.append(i)
+            yield os.urandom(64 * 1024)
+
+    stream = archive.iter_zip([("random.bin", chunks())])
+    next(stream)
+    assert consumed == [0]
+
+
+class TestZipFilesToS3(FakeS3TestCase):
+    def test_zips_files_with_manifest(self):
+        self.s3.objects[("bucket", "jobs/1/generated/a.txt")] = b"a" * 2048
+        self.s3.objects[("bucket", "jobs/1/generated/sub/b.txt")] = b"bb"
+
+        manifest = archive.zip_files_to_s3(
+            "bucket",
+            ["jobs/1/generated/a.txt", "jobs/1/generated/sub/b.txt"],
+            "jobs/1/generated.zip",
+            prefix="jobs/1/generated/",
+        )
+
+        data = self.s3.objects[("bucket", "jobs/1/generated.zip")]
+        assert manifest["archive_size"] == len(data)
+        assert manifest["total_size"] == 2050
+        assert [(f["name"], f["size"], f["size_display"]) for f in manifest["files"]] == [
+            ("a.txt", 2048, "2.0 KB"),
+            ("sub/b.txt", 2, "2.0 bytes"),
+        ]
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert zf.namelist() == ["a.txt", "sub/b.txt", archive.MANIFEST_NAME]
+            assert zf.read("sub/b.txt") == b"bb"
+            stored = json.loads(zf.read(archive.MANIFEST_NAME))
+        assert stored["files"] == manifest["files"]
+
+    def test_large_archive_uses_multipart_upload(self):
+        payload = os.urandom(PART_SIZE * 2 + 1000)
+        self.s3.objects[("bucket", "big.bin")] = payload
+
+        manifest = archive.zip_files_to_s3(
+            "bucket", ["big.bin"], "big.zip", include_manifest=False, part_size=PART_SIZE, max_concurrency=2
+        )
+
+        assert manifest is not None
+        assert not self.s3.uploads
+        with zipfile.ZipFile(io.BytesIO(self.s3.objects[("bucket", "big.zip")])) as zf:
+            assert zf.namelist() == ["big.bin"]
+            assert zf.read("big.bin") == payload
+
+    def test_missing_file_aborts_upload(self):
+        self.s3.objects[("bucket", "a.txt")] = os.urandom(PART_SIZE * 2 + 1000)
+
+        manifest = archive.zip_files_to_s3("bucket", ["a.txt", "missing.txt"], "out.zip", part_size=PART_SIZE)
+
+        assert manifest is None
+        assert ("bucket", "out.zip") not in self.s3.objects
+        assert self.s3.aborted
+
+    def test_job_handler(self):
+        self.s3.objects[("bucket", "out/a.txt")] = b"a"
+        handler = job_handlers[FileType.ZIPPED_GENERATED.value]
+        assert handler is archive.zip_generated_files
+
+        result = handler(
+            {"bucket": "bucket", "file_keys": ["out/a.txt"], "destination_key": "out.zip", "prefix": "out/"}
+        )
+
+        assert result["files"][0]["name"] == "a.txt"
+        assert s3.file_exists("bucket", "out.zip")
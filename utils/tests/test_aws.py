@@ -0,0 +1,36 @@
+"""
+Tests for the shared boto3 client registry
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils import aws
+
+
+class TestClientRegistry:
+    @pytest.fixture(autouse=True)
+    def reset(self, monkeypatch):
+        monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+        aws.reset_clients()
+        yield
+        aws.reset_clients()
+
+    def test_clients_are_reused(self):
+        assert aws.get_client("s3") is aws.get_client("s3")
+        assert aws.get_client("s3") is not aws.get_client("s3", region_name="eu-west-1")
+        assert aws.get_client("secretsmanager") is not aws.get_client("s3")
+
+    def test_concurrent_creation_builds_one_client(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            clients = list(executor.map(lambda _: aws.get_client("s3"), range(32)))
+        assert len({id(client) for client in clients}) == 1
+
+    def test_reset(self):
+        client = aws.get_client("s3")
+        aws.reset_clients()
+        assert aws.get_client("s3") is not client
+
+    def test_pool_size(self):
+        assert aws.get_client("s3").meta.config.max_pool_connections == aws.settings.AWS_MAX_POOL_CONNECTIONS
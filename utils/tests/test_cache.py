@@ -0,0 +1,51 @@
+"""
+Tests for the in-process TTL/LRU cache
+"""
+
+from unittest import mock
+
+from utils.cache import TTLCache
+
+
+class TestTTLCache:
+    def test_get_and_set(self):
+        cache = TTLCache(max_entries=2, ttl=60)
+        assert cache.get("a") is None
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_lru_eviction(self):
+        cache = TTLCache(max_entries=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.evictions == 1
+
+    def test_size_eviction(self):
+        cache = TTLCache(max_entries=10, ttl=60, max_size=100)
+        cache.set("a", "x", size=60)
+        cache.set("b", "y", size=60)
+        assert cache.get("a") is None
+        assert cache.get("b") == "y"
+
+        # entries larger than the whole cache are never stored
+        cache.set("c", "z", size=101)
+        assert cache.get("c") is None
+        assert cache.get("b") == "y"
+
+    def test_expiry(self):
+        cache = TTLCache(max_entries=10, ttl=60)
+        with mock.patch("utils.cache.time.monotonic", return_value=1000.0):
+            cache.set("a", 1)
+            cache.set("b", 2, ttl=120)
+        with mock.patch("utils.cache.time.monotonic", return_value=1061.0):
+            assert cache.get("a") is None
+            assert cache.get("b") == 2
+        assert cache.expirations == 1
+        assert len(cache) == 1
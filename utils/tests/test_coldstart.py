@@ -0,0 +1,65 @@
+"""
+Tests for the cold start profiler, that the Lambda entry point stays lazy, and that lazy engine creation is thread-safe
+"""
+
+import threading
+import time
+
+import database
+from utils.coldstart import ImportTiming, format_report, parse_importtime, profile_imports
+
+IMPORTTIME_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     encodings.idna
+import time:       300 |        420 |   json
+import time:      1000 |       1420 | app
+"""
+
+
+class TestColdstart:
+    def test_parse_importtime(self):
+        assert parse_importtime(IMPORTTIME_OUTPUT) == [
+            ImportTiming("encodings.idna", 120, 120, 2),
+            ImportTiming("json", 300, 420, 1),
+            ImportTiming("app", 1000, 1420, 0),
+        ]
+
+    def test_format_report(self):
+        report = format_report(parse_importtime(IMPORTTIME_OUTPUT), 0.00142, top=2)
+        assert "Total import time: 1 ms" in report
+        assert "app" in report and "json" in report and "idna" not in report
+
+    def test_app_import_defers_drivers_and_aws(self):
+        timings, total = profile_imports("app")
+        modules = {timing.module for timing in timings}
+        assert total > 0
+        assert "boto3" not in modules
+        assert "psycopg2" not in modules
+        assert "asyncpg" not in modules
+
+    def test_engine_is_published_only_once_ready(self, monkeypatch):
+        for name in ("engine", "SessionLocal", "async_engine", "AsyncSessionLocal"):
+            monkeypatch.setattr(database, name, None)
+        instrumenting = threading.Event()
+        instrument_engine = database.instrument_engine
+
+        def slow_instrument_engine(*args):
+            instrumenting.set()
+            time.sleep(0.2)
+            instrument_engine(*args)
+
+        monkeypatch.setattr(database, "instrument_engine", slow_instrument_engine)
+        errors = []
+
+        def open_session():
+            instrumenting.wait()
+            try:
+                with database.session_scope():
+                    pass
+            except Exception as e:
+                errors.append(e)
+
+        other = threading.Thread(target=open_session)
+        other.start()
+        database.get_engine()
+        other.join()
+        assert errors == []
@@ -0,0 +1,120 @@
+"""
+Tests for the columnar doc fields store, checked against brute force scans of the plain fields
+"""
+
+import json
+import math
+import random
+
+from utils.types.compact_doc_fields import CompactDocFields
+
+
+def make_field(page, key, left, top, width=0.05, height=0.02, value="v", selection=False):
+    return {
+        "page": page,
+        "key": key,
+        "value": value,
+        "boundingBox": {"width": width, "height": height, "left": left, "top": top},
+        "isSelection": selection,
+    }
+
+
+def random_fields(count, pages=3, seed=1):
+    rng = random.Random(seed)
+    return [
+        make_field(
+            rng.randint(1, pages),
+            f"key-{rng.randint(0, 50)}",
+            rng.random() * 0.9,
+            rng.random() * 0.95,
+            width=rng.random() * 0.1,
+            height=rng.random() * 0.05,
+            value=None if rng.random() < 0.2 else str(rng.random()),
+            selection=rng.random() < 0.3,
+        )
+        for _ in range(count)
+    ]
+
+
+def distance(field, x, y):
+    box = field["boundingBox"]
+    dx = max(box["left"] - x, 0.0, x - box["left"] - box["width"])
+    dy = max(box["top"] - y, 0.0, y - box["top"] - box["height"])
+    return math.hypot(dx, dy)
+
+
+def test_round_trip_is_lossless():
+    fields = random_fields(500)
+    store = CompactDocFields.from_fields(fields)
+
+    assert len(store) == 500
+    assert store.to_fields() == fields
+    assert json.dumps(store.to_response("s3://file")) == json.dumps({"file_url": "s3://file", "fields": fields})
+    assert store[-1] == fields[-1]
+    assert len(store.keys) <= 51
+
+
+def test_fields_by_page_and_key():
+    fields = random_fields(200)
+    store = CompactDocFields.from_fields(fields)
+
+    assert store.pages() == sorted({f["page"] for f in fields})
+    assert store.fields_on_page(2) == [f for f in fields if f["page"] == 2]
+    assert store.fields_with_key("key-7") == [f for f in fields if f["key"] == "key-7"]
+    assert store.fields_with_key("missing") == []
+
+
+def test_fields_in_region_matches_scan():
+    fields = random_fields(2000)
+    store = CompactDocFields.from_fields(fields)
+    rng = random.Random(2)
+
+    for _ in range(50):
+        page, left, top = rng.randint(1, 3), rng.random() * 0.8, rng.random() * 0.8
+        width, height = rng.random() * 0.3, rng.random() * 0.3
+        inside = [
+            f
+            for f in fields
+            if f["page"] == page
+            and f["boundingBox"]["left"] >= left
+            and f["boundingBox"]["top"] >= top
+            and f["boundingBox"]["left"] + f["boundingBox"]["width"] <= left + width
+            and f["boundingBox"]["top"] + f["boundingBox"]["height"] <= top + height
+        ]
+        overlapping = [
+            f
+            for f in fields
+            if f["page"] == page
+            and f["boundingBox"]["left"] <= left + width
+            and f["boundingBox"]["left"] + f["boundingBox"]["width"] >= left
+            and f["boundingBox"]["top"] <= top + height
+            and f["boundingBox"]["top"] + f["boundingBox"]["height"] >= top
+        ]
+        assert store.fields_in_region(page, left, top, width, height) == inside
+        assert store.fields_in_region(page, left, top, width, height, contained=False) == overlapping
+
+
+def test_nearest_field_matches_scan():
+    fields = random_fields(2000)
+    store = CompactDocFields.from_fields(fields)
+    rng = random.Random(3)
+
+    for _ in range(100):
+        # Include points off the page
+        page, x, y = rng.randint(1, 3), rng.uniform(-0.5, 1.5), rng.uniform(-0.5, 1.5)
+        candidates = [f for f in fields if f["page"] == page]
+        expected = min(candidates, key=lambda f: distance(f, x, y))
+        assert distance(store.nearest_field(page, x, y), x, y) == distance(expected, x, y)
+
+
+def test_empty_page_and_appends():
+    store = CompactDocFields()
+    assert store.nearest_field(1, 0.5, 0.5) is None
+    assert store.fields_in_region(1, 0, 0, 1, 1) == []
+
+    store.append(make_field(1, "a", 0.1, 0.1))
+    assert store.nearest_field(1, 0.9, 0.9)["key"] == "a"
+    # Appending invalidates the page's index
+    store.append(make_field(1, "b", 0.8, 0.8))
+    assert store.nearest_field(1, 0.9, 0.9)["key"] == "b"
+    assert store.nbytes() < len(json.dumps(store.to_fields()))
@@ -0,0 +1,61 @@
+"""
+Tests for database pool profiles and instrumentation
+"""
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool, QueuePool
+
+from config import settings
+from utils.db_pool import PoolStats, get_engine_options, get_pool_profile, instrument_engine
+
+POSTGRES_URI = "postgresql://localhost:5432/chai-chat-demo-test"
+
+
+class TestPoolProfiles:
+    def test_auto_profile(self, monkeypatch):
+        monkeypatch.setattr(settings, "DB_POOL_PROFILE", "auto")
+        monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME", raising=False)
+        assert get_pool_profile() == "server"
+
+        monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "chat")
+        assert get_pool_profile() == "lambda"
+
+    def test_invalid_profile(self, monkeypatch):
+        monkeypatch.setattr(settings, "DB_POOL_PROFILE", "huge")
+        with pytest.raises(ValueError):
+            get_pool_profile()
+
+    def test_profile_options(self, monkeypatch):
+        stats = PoolStats("test")
+
+        monkeypatch.setattr(settings, "DB_POOL_PROFILE", "null")
+        assert issubclass(get_engine_options(POSTGRES_URI, stats)["poolclass"], NullPool)
+
+        monkeypatch.setattr(settings, "DB_POOL_PROFILE", "lambda")
+        options = get_engine_options(POSTGRES_URI, stats)
+        assert issubclass(options["poolclass"], QueuePool)
+        assert options["pool_size"] == settings.DB_LAMBDA_POOL_SIZE
+        assert options["pool_pre_ping"] is True
+
+        monkeypatch.setattr(settings, "DB_POOL_PROFILE", "server")
+        assert get_engine_options(POSTGRES_URI, stats)["pool_size"] == settings.DB_POOL_SIZE
+
+
+class TestPoolStats:
+    def test_checkouts_are_counted(self):
+        stats = PoolStats("test")
+        events = []
+        stats.add_listener(lambda event_name, pool_stats, duration: events.append(event_name))
+
+        engine = create_engine("sqlite://", **get_engine_options("sqlite://", stats))
+        instrument_engine(engine, stats)
+        for _ in range(2):
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+
+        assert stats.checkouts == 2
+        assert stats.checkins == 2
+        assert stats.connects == 2
+        assert events.count("checkout") == 2
+        assert stats.stats()["pool"] == "TimedNullPool"
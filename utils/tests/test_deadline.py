@@ -0,0 +1,89 @@
+"""
+Tests for request deadlines
+"""
+
+import asyncio
+
+import pytest
+
+from exceptions import ChatDemoException
+from utils import deadline
+
+
+class FakeLambdaContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+class FakeConnection:
+    class dialect:
+        name = "postgresql"
+
+    def __init__(self):
+        self.statements = []
+
+    def exec_driver_sql(self, statement):
+        self.statements.append(statement)
+
+
+class TestDeadline:
+    @pytest.fixture(autouse=True)
+    def settings(self, monkeypatch):
+        monkeypatch.setattr(deadline.settings, "REQUEST_TIMEOUT", 0)
+        monkeypatch.setattr(deadline.settings, "DEADLINE_SAFETY_MARGIN", 1.0)
+        monkeypatch.setattr(deadline.settings, "DEADLINE_MIN_BUDGET", 0.5)
+
+    def test_request_timeout(self, monkeypatch):
+        assert deadline.request_timeout({"headers": []}) is None
+        assert deadline.request_timeout({"aws.context": FakeLambdaContext(30000), "headers": []}) == 29.0
+        scope = {"aws.context": FakeLambdaContext(30000), "headers": [(b"x-request-timeout", b"10")]}
+        assert deadline.request_timeout(scope) == 9.0
+        assert deadline.request_timeout({"headers": [(b"x-request-timeout", b"soon")]}) is None
+
+        monkeypatch.setattr(deadline.settings, "REQUEST_TIMEOUT", 5)
+        assert deadline.request_timeout({"headers": []}) == 4.0
+
+    def test_ensure_time_left(self):
+        assert deadline.ensure_time_left("call") is None
+
+        token = deadline.set_deadline(10)
+        try:
+            assert 9 < deadline.ensure_time_left("call") <= 10
+        finally:
+            deadline.reset_deadline(token)
+
+        token = deadline.set_deadline(0.1)
+        try:
+            with pytest.raises(ChatDemoException) as exc_info:
+                deadline.ensure_time_left("call")
+            assert exc_info.value.status_code == 504
+        finally:
+            deadline.reset_deadline(token)
+
+    def test_within_deadline(self):
+        async def run(timeout, delay):
+            token = deadline.set_deadline(timeout)
+            try:
+                return await deadline.within_deadline(asyncio.sleep(delay, "done"), "call")
+            finally:
+                deadline.reset_deadline(token)
+
+        assert asyncio.run(run(1, 0)) == "done"
+        with pytest.raises(ChatDemoException):
+            asyncio.run(run(0.6, 1))
+
+    def test_statement_timeout(self):
+        connection = FakeConnection()
+        deadline.apply_statement_timeout(None, None, connection)
+        assert connection.statements == []
+
+        token = deadline.set_deadline(2)
+        try:
+            deadline.apply_statement_timeout(None, None, connection)
+        finally:
+            deadline.reset_deadline(token)
+        timeout = int(connection.statements[0].rsplit(" ", 1)[1])
+        assert 1900 < timeout <= 2000
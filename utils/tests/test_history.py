@@ -0,0 +1,36 @@
+"""
+Tests for chat history compaction
+"""
+
+from utils.history import HistoryCompactor, message_size
+
+
+def make_history(count: int, length: int = 10) -> list:
+    return [{"sender": "User", "message": f"{i:0{length}d}"} for i in range(count)]
+
+
+class TestHistoryCompactor:
+    def test_under_budget_is_unchanged(self):
+        history = make_history(3)
+        assert HistoryCompactor(max_chars=1000).compact(history) is history
+
+    def test_keeps_most_recent_messages(self):
+        history = make_history(10)
+        size = message_size("User", history[0]["message"])
+        compactor = HistoryCompactor(max_chars=size * 3 + 1)
+
+        assert compactor.compact(history) == history[-3:]
+        assert compactor.stats() == {"compacted": 1, "dropped_messages": 7}
+
+    def test_token_and_message_budgets(self):
+        history = make_history(10)
+        assert len(HistoryCompactor(max_tokens=10).compact(history)) == 2
+        assert len(HistoryCompactor(max_chars=1000, max_messages=4).compact(history)) == 4
+
+    def test_always_keeps_newest_message(self):
+        history = make_history(3, length=100)
+        assert HistoryCompactor(max_chars=10).compact(history) == history[-1:]
+
+    def test_disabled(self):
+        history = make_history(100)
+        assert HistoryCompactor().compact(history) is history
@@ -0,0 +1,92 @@
+"""
+Tests for the adaptive upstream concurrency limiter
+"""
+
+import asyncio
+
+import pytest
+
+from exceptions import ChatDemoException
+from utils.limiter import AdaptiveLimiter
+
+
+def make_limiter(**kwargs) -> AdaptiveLimiter:
+    options = dict(limit=2, min_limit=1, max_limit=4, max_queue=1, queue_timeout=0.05, latency_target=1.0)
+    options.update(kwargs)
+    return AdaptiveLimiter(**options)
+
+
+class TestAdaptiveLimiter:
+    def test_queues_when_at_limit(self):
+        limiter = make_limiter(queue_timeout=1.0)
+
+        async def main():
+            await limiter.acquire()
+            await limiter.acquire()
+            waiter = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0)
+            assert limiter.queue_depth == 1
+            limiter.release()
+            await waiter
+            assert limiter.in_flight == 2
+            assert limiter.queue_depth == 0
+
+        asyncio.run(main())
+
+    def test_rejects_when_queue_full(self):
+        limiter = make_limiter(limit=1, queue_timeout=1.0)
+
+        async def main():
+            await limiter.acquire()
+            waiter = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0)
+            with pytest.raises(ChatDemoException) as exc_info:
+                await limiter.acquire()
+            waiter.cancel()
+            return exc_info.value
+
+        exc = asyncio.run(main())
+        assert exc.status_code == 429
+        assert "Retry-After" in exc.headers
+        assert limiter.rejected == 1
+
+    def test_queue_timeout(self):
+        limiter = make_limiter(limit=1)
+
+        async def main():
+            await limiter.acquire()
+            with pytest.raises(ChatDemoException) as exc_info:
+                await limiter.acquire()
+            return exc_info.value
+
+        exc = asyncio.run(main())
+        assert exc.status_code == 503
+        assert limiter.timed_out == 1
+        assert limiter.queue_depth == 0
+
+    def test_aimd(self):
+        limiter = make_limiter()
+        for _ in range(10):
+            limiter.record(0.1)
+        assert limiter.limit > 2
+
+        limiter.record(0.1, overloaded=True)
+        limiter.record(5.0)
+        assert limiter.overloads == 1
+        assert limiter.limit < 4
+
+        for _ in range(100):
+            limiter.record(5.0)
+        assert limiter.limit == 1
+
+    def test_slot_releases_on_error(self):
+        limiter = make_limiter()
+
+        async def main():
+            with pytest.raises(ValueError):
+                async with limiter.slot():
+                    raise ValueError("upstream failed")
+
+        asyncio.run(main())
+        assert limiter.in_flight == 0
+        assert limiter.overloads == 1
@@ -0,0 +1,49 @@
+"""
+Tests for the logging pipeline
+"""
+
+import io
+import json
+import logging
+import sys
+
+from utils import logger as log
+
+
+def make_record(name="root", level=logging.INFO, msg="Hello %s", args=("world",)):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+class TestLogger:
+    def test_json_formatter(self):
+        entry = json.loads(log.JsonFormatter().format(make_record(name="httpx")))
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "httpx"
+        assert entry["message"] == "Hello world"
+
+    def test_json_formatter_exception(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.LogRecord("root", logging.ERROR, __file__, 1, "Failed", (), sys.exc_info())
+        assert "ValueError: boom" in json.loads(log.JsonFormatter().format(record))["exception"]
+
+    def test_sampling_filter(self, monkeypatch):
+        sampler = log.SamplingFilter({"httpx": 0.0, "noisy": 1.0})
+        assert not sampler.filter(make_record(name="httpx"))
+        assert not sampler.filter(make_record(name="httpx._client"))
+        assert sampler.filter(make_record(name="httpx", level=logging.WARNING))
+        assert sampler.filter(make_record(name="noisy"))
+        assert sampler.filter(make_record(name="other"))
+
+    def test_records_are_formatted_by_the_listener(self):
+        record = make_record()
+        assert log._DeferredQueueHandler(None).prepare(record) is record
+        assert record.msg == "Hello %s"
+
+    def test_flush_logs(self, monkeypatch):
+        stream = io.StringIO()
+        monkeypatch.setattr(log.handler, "stream", stream)
+        log.logger.warning("Flushed %s", "record")
+        log.flush_logs()
+        assert "Flushed record" in stream.getvalue()
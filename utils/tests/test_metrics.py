@@ -0,0 +1,110 @@
+"""
+Tests for the metrics registry, its Prometheus and EMF output, and the request middleware
+"""
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app
+from utils.metrics import Metrics
+
+
+class TestMetrics:
+    def test_counters_from_several_threads(self):
+        registry = Metrics()
+
+        def work():
+            for _ in range(1000):
+                registry.inc("jobs_total", {"kind": "a"})
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        counters, _ = registry.snapshot()
+        assert counters[("jobs_total", (("kind", "a"),))] == 4000
+
+    def test_short_lived_threads_are_folded_in(self):
+        registry = Metrics()
+
+        def work():
+            registry.inc("jobs_total")
+
+        for _ in range(200):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                for _ in range(2):
+                    executor.submit(work)
+
+        counters, _ = registry.snapshot()
+        assert counters[("jobs_total", ())] == 400
+        assert len(registry._shards) <= 2
+
+    def test_prometheus_format(self):
+        registry = Metrics(buckets=(0.1, 1.0))
+        registry.observe("call_seconds", 0.05, {"component": "db"})
+        registry.observe("call_seconds", 0.5, {"component": "db"})
+        registry.observe("call_seconds", 5, {"component": "db"})
+        registry.add("calls_in_flight", 1)
+        registry.register_collector("cache", lambda: {"hits": 3, "enabled": True, "name": "x", "local": {"size": 7}})
+
+        text = registry.render_prometheus()
+        assert "# TYPE calls_in_flight gauge\ncalls_in_flight 1\n" in text
+        assert 'call_seconds_bucket{component="db",le="0.1"} 1\n' in text
+        assert 'call_seconds_bucket{component="db",le="1.0"} 2\n' in text
+        assert 'call_seconds_bucket{component="db",le="+Inf"} 3\n' in text
+        assert 'call_seconds_count{component="db"} 3\n' in text
+        assert "cache_hits 3\n" in text
+        assert "cache_enabled 1\n" in text
+        assert "cache_local_size 7\n" in text
+        assert "cache_name" not in text
+
+    def test_timer_counts_errors(self):
+        registry = Metrics()
+        with registry.timer("s3"):
+            pass
+        with pytest.raises(ValueError):
+            with registry.timer("s3"):
+                raise ValueError()
+
+        counters, histograms = registry.snapshot()
+        assert counters[("component_errors_total", (("component", "s3"),))] == 1
+        assert histograms[("component_duration_seconds", (("component", "s3"),))][-1] > 0
+
+    def test_emf_reports_deltas(self, capsys):
+        registry = Metrics(buckets=(0.1, 1.0))
+        registry.inc("requests_total", {"route": "/chat"}, 2)
+        registry.observe("latency_seconds", 0.05)
+        registry.observe("latency_seconds", 3)
+        assert registry.emit_emf(force=True)
+
+        documents = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert len(documents) == 2
+        counter = next(d for d in documents if "requests_total" in d)
+        assert counter["requests_total"] == 2 and counter["route"] == "/chat"
+        assert counter["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["route"]]
+        latency = next(d for d in documents if "latency_seconds" in d)
+        assert latency["latency_seconds"] == {"Values": [0.1, 1.0], "Counts": [1, 1]}
+
+        registry.inc("requests_total", {"route": "/chat"})
+        assert registry.emit_emf(force=True)
+        documents = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert [d["requests_total"] for d in documents] == [1]
+
+        assert not registry.emit_emf()
+
+    def test_middleware_and_endpoint(self):
+        with TestClient(app) as client:
+            client.get("/api/v1/chat/status")
+            client.get("/no/such/route")
+            text = client.get("/metrics").text
+
+        assert 'http_requests_total{method="GET",route="/api/v1/chat/status",status="200"}' in text
+        assert 'http_requests_total{method="GET",route="unmatched",status="404"}' in text
+        assert "http_requests_in_flight" in text
+        assert "upstream_limiter_limit" in text
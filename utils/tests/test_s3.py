@@ -0,0 +1,404 @@
+"""
+Tests for the S3 helpers, run against an in-memory fake of the S3 client
+"""
+
+import asyncio
+import datetime
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+from utils import s3
+
+PART_SIZE = s3.MIN_PART_SIZE
+
+
+def check_metadata(params):
+    # Like botocore, which encodes each metadata value into a header
+    for value in params.get("Metadata", {}).values():
+        value.encode()
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.aborted = []
+        self.fail_part = None
+        self.delete_requests = 0
+        self.signed = 0
+        self.upload_keys = {}
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = bytes(Body)
+        return {}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        check_metadata(kwargs)
+        upload_id = f"upload-{len(self.uploads) + len(self.aborted) + 1}"
+        self.uploads[upload_id] = {}
+        self.upload_keys[upload_id] = (Key, datetime.datetime.now(datetime.timezone.utc))
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber == self.fail_part:
+            raise RuntimeError("part failed")
+        with self._lock:
+            self.uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": f'"etag-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        assert numbers == sorted(parts)
+        self.objects[(Bucket, Key)] = b"".join(parts[number] for number in numbers)
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+        self.aborted.append(UploadId)
+        return {}
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey", "Message": "Not Found"}}, "GetObject")
+        return {"Body": FakeBody(self.objects[(Bucket, Key)])}
+
+    def head_object(self, Bucket, Key):
+        if Key == "forbidden":
+            raise ClientError({"Error": {"Code": "403", "Message": "Forbidden"}}, "HeadObject")
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def delete_objects(self, Bucket, Delete):
+        self.delete_requests += 1
+        assert len(Delete["Objects"]) <= 1000
+        errors = []
+        for obj in Delete["Objects"]:
+            if obj["Key"] == "locked":
+                errors.append({"Key": "locked", "Code": "AccessDenied", "Message": "Access Denied"})
+            else:
+                self.objects.pop((Bucket, obj["Key"]), None)
+        return {"Errors": errors}
+
+    def copy_object(self, Bucket, CopySource, Key):
+        self.objects[(Bucket, Key)] = self.objects[(CopySource["Bucket"], CopySource["Key"])]
+        return {}
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn):
+        check_metadata(Params)
+        self.signed += 1
+        return f"https://s3.test/{Params['Bucket']}/{Params['Key']}?method={ClientMethod}&n={self.signed}"
+
+    def get_paginator(self, operation_name):
+        if operation_name == "list_parts":
+            return FakeListPartsPaginator(self)
+        if operation_name == "list_multipart_uploads":
+            return FakeListUploadsPaginator(self)
+        assert operation_name == "list_objects_v2"
+        return FakePaginator(self)
+
+
+class FakeBody:
+    def __init__(self, data):
+        self.data = data
+        self.closed = False
+
+    def iter_chunks(self, chunk_size):
+        for start in range(0, len(self.data), chunk_size):
+            yield self.data[start : start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+class FakePaginator:
+    def __init__(self, fake_s3):
+        self.fake_s3 = fake_s3
+
+    def paginate(self, Bucket, Prefix="", Delimiter=None, PaginationConfig=None):
+        page_size = (PaginationConfig or {}).get("PageSize", 1000)
+        contents, prefixes = [], []
+        for bucket, key in sorted(self.fake_s3.objects):
+            if bucket != Bucket or not key.startswith(Prefix):
+                continue
+            rest = key[len(Prefix) :]
+            if Delimiter and Delimiter in rest:
+                common_prefix = Prefix + rest.split(Delimiter)[0] + Delimiter
+                if common_prefix not in prefixes:
+                    prefixes.append(common_prefix)
+                continue
+            contents.append(
+                {
+                    "Key": key,
+                    "Size": len(self.fake_s3.objects[(bucket, key)]),
+                    "ETag": '"etag"',
+                    "LastModified": datetime.datetime(2024, 1, 1),
+                }
+            )
+        for start in range(0, max(len(contents), 1), page_size):
+            page = {"Contents": contents[start : start + page_size]}
+            if start == 0:
+                page["CommonPrefixes"] = [{"Prefix": prefix} for prefix in prefixes]
+            yield page
+
+
+def chunks_of(data: bytes, size: int = 1024 * 1024):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+class FakeListPartsPaginator:
+    def __init__(self, fake_s3):
+        self.fake_s3 = fake_s3
+
+    def paginate(self, Bucket, Key, UploadId):
+        parts = self.fake_s3.uploads[UploadId]
+        yield {
+            "Parts": [
+                {"PartNumber": number, "ETag": f'"etag-{number}"', "Size": len(data)}
+                for number, data in sorted(parts.items())
+            ]
+        }
+
+
+class FakeListUploadsPaginator:
+    def __init__(self, fake_s3):
+        self.fake_s3 = fake_s3
+
+    def paginate(self, Bucket, Prefix=""):
+        yield {
+            "Uploads": [
+                {"Key": key, "UploadId": upload_id, "Initiated": initiated}
+                for upload_id, (key, initiated) in list(self.fake_s3.upload_keys.items())
+                if upload_id in self.fake_s3.uploads and key.startswith(Prefix)
+            ]
+        }
+
+
+class FakeS3TestCase:
+    @pytest.fixture(autouse=True)
+    def fake_s3(self, monkeypatch):
+        self.s3 = FakeS3()
+        monkeypatch.setattr(s3, "get_client", lambda service_name, **kwargs: self.s3)
+
+
+class TestUploadStream(FakeS3TestCase):
+    def test_small_stream_uses_single_put(self):
+        assert s3.upload_stream(chunks_of(b"hello"), "bucket", "key", part_size=PART_SIZE)
+        assert self.s3.objects[("bucket", "key")] == b"hello"
+        assert self.s3.uploads == {}
+
+    def test_multipart_stream(self):
+        data = bytes(range(256)) * (PART_SIZE * 3 // 256 + 100)
+        assert s3.upload_stream(chunks_of(data), "bucket", "key", part_size=PART_SIZE, max_concurrency=2)
+        assert self.s3.objects[("bucket", "key")] == data
+
+    def test_failed_stream_is_aborted(self):
+        self.s3.fail_part = 2
+        data = b"x" * (PART_SIZE * 3)
+        assert not s3.upload_stream(chunks_of(data), "bucket", "key", part_size=PART_SIZE)
+        assert self.s3.aborted == ["upload-1"]
+        assert ("bucket", "key") not in self.s3.objects
+
+    def test_cancelled_async_stream_is_aborted(self):
+        async def main():
+            sent = asyncio.Event()
+
+            async def stalling_chunks():
+                for chunk in chunks_of(b"x" * (PART_SIZE * 3)):
+                    yield chunk
+                sent.set()
+                await asyncio.sleep(10)
+
+            upload = asyncio.ensure_future(
+                s3.upload_async_stream(stalling_chunks(), "bucket", "key", part_size=PART_SIZE)
+            )
+            await sent.wait()
+            upload.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await upload
+
+        asyncio.run(main())
+        assert self.s3.aborted == ["upload-1"]
+        assert self.s3.uploads == {}
+
+    def test_async_stream(self):
+        data = bytes(range(256)) * (PART_SIZE * 3 // 256 + 100)
+
+        async def async_chunks(payload):
+            for chunk in chunks_of(payload):
+                yield chunk
+
+        assert asyncio.run(s3.upload_async_stream(async_chunks(data), "bucket", "big", part_size=PART_SIZE))
+        assert self.s3.objects[("bucket", "big")] == data
+
+        assert asyncio.run(s3.upload_async_stream(async_chunks(b"small"), "bucket", "small", part_size=PART_SIZE))
+        assert self.s3.objects[("bucket", "small")] == b"small"
+
+
+class TestListing(FakeS3TestCase):
+    @pytest.fixture(autouse=True)
+    def objects(self, fake_s3):
+        for directory in ("a", "b", "c"):
+            for i in range(1500):
+                self.s3.objects[("bucket", f"{directory}/{i:04d}")] = b"x" * i
+        self.s3.objects[("bucket", "top.txt")] = b"top"
+
+    def test_iter_files_pages_through_everything(self):
+        files = list(s3.iter_files("bucket", prefix="a/", page_size=1000))
+        assert len(files) == 1500
+        assert files[10] == s3.S3Object("a/0010", 10, "etag", datetime.datetime(2024, 1, 1))
+
+    def test_delimiter(self):
+        assert [f.key for f in s3.iter_files("bucket", delimiter="/")] == ["top.txt"]
+        assert list(s3.iter_prefixes("bucket")) == ["a/", "b/", "c/"]
+
+    def test_iter_files_concurrently(self):
+        files = list(s3.iter_files_concurrently("bucket", s3.iter_prefixes("bucket"), max_workers=3))
+        assert len(files) == 4500
+        assert len({f.key for f in files}) == 4500
+
+    def test_iter_all_files_concurrently_includes_top_level(self):
+        files = list(s3.iter_all_files_concurrently("bucket", max_workers=3))
+        assert len(files) == 4501
+        assert "top.txt" in {f.key for f in files}
+
+    def test_iter_files_concurrently_stops_early(self):
+        files = s3.iter_files_concurrently("bucket", ["a/", "b/", "c/"], max_workers=3, buffer_pages=1)
+        assert next(files).key.endswith("0000")
+        files.close()
+
+    def test_get_all_files_in_bucket_is_not_truncated(self):
+        assert len(s3.get_all_files_in_bucket("bucket")) == 4501
+
+
+class TestBatchOperations(FakeS3TestCase):
+    @pytest.fixture(autouse=True)
+    def objects(self, fake_s3):
+        for i in range(2500):
+            self.s3.objects[("bucket", f"file-{i}")] = b"data"
+
+    def test_file_exists(self):
+        assert s3.file_exists("bucket", "file-1")
+        assert not s3.file_exists("bucket", "missing")
+        with pytest.raises(ClientError):
+            s3.file_exists("bucket", "forbidden")
+
+    def test_delete_files(self):
+        keys = [f"file-{i}" for i in range(2500)] + ["locked"]
+        result = s3.delete_files("bucket", keys)
+        assert self.s3.delete_requests == 3
+        assert len(result.results) == 2500
+        assert list(result.errors) == ["locked"]
+        assert not result.ok
+        assert self.s3.objects == {}
+
+    def test_files_exist_and_metadata(self):
+        result = s3.files_exist("bucket", ["file-1", "missing", "forbidden"])
+        assert result.results == {"file-1": True, "missing": False}
+        assert list(result.errors) == ["forbidden"]
+
+        result = s3.get_files_metadata("bucket", ["file-1", "missing"])
+        assert result.results == {"file-1": {"ContentLength": 4}, "missing": None}
+
+    def test_copy_files(self):
+        copies = [("bucket", f"file-{i}", "other", f"copy-{i}") for i in range(10)] + [
+            ("bucket", "file-0", "third", "copy-0"),
+            ("bucket", "missing", "other", "copy-missing"),
+        ]
+        result = s3.copy_files(copies, max_workers=4)
+        assert len(result.results) == 11
+        assert ("third", "copy-0") in result.results
+        assert list(result.errors) == [("other", "copy-missing")]
+        assert self.s3.objects[("other", "copy-3")] == b"data"
+
+
+class TestSignedUrlCache(FakeS3TestCase):
+    @pytest.fixture(autouse=True)
+    def clear_cache(self, fake_s3):
+        s3.signed_url_cache.clear()
+        yield
+        s3.signed_url_cache.clear()
+
+    def test_reuses_url_within_validity(self):
+        url = s3.get_signed_url("bucket", "file", expiration=600)
+        assert s3.get_signed_url("bucket", "file", expiration=600) == url
+        assert self.s3.signed == 1
+
+    def test_distinguishes_requests(self):
+        s3.get_signed_url("bucket", "file", expiration=600)
+        s3.get_signed_url("bucket", "file", expiration=600, filename="report.pdf")
+        s3.get_signed_url("bucket", "file", expiration=300)
+        s3.get_signed_upload_url("bucket", "file", "text/plain", expiration=600)
+        s3.get_signed_upload_url("bucket", "file", "image/png", expiration=600)
+        assert self.s3.signed == 5
+
+    def test_short_expiration_is_not_cached(self, monkeypatch):
+        monkeypatch.setattr(s3.settings, "S3_SIGNED_URL_SAFETY_MARGIN", 60)
+        first = s3.get_signed_url("bucket", "file", expiration=60)
+        assert s3.get_signed_url("bucket", "file", expiration=60) != first
+
+    def test_cache_can_be_bypassed(self):
+        first = s3.get_signed_url("bucket", "file", expiration=600)
+        assert s3.get_signed_url("bucket", "file", expiration=600, use_cache=False) != first
+
+
+class TestSignedMultipartUpload(FakeS3TestCase):
+    @pytest.fixture(autouse=True)
+    def clear_cache(self, fake_s3):
+        s3.signed_url_cache.clear()
+
+    def test_plan_parts(self):
+        assert s3.plan_parts(1, part_size=PART_SIZE) == (PART_SIZE, 1)
+        assert s3.plan_parts(3 * PART_SIZE + 1, part_size=PART_SIZE) == (PART_SIZE, 4)
+        part_size, count = s3.plan_parts(100 * 1024**3, part_size=PART_SIZE)
+        assert count <= s3.MAX_PARTS and part_size * count >= 100 * 1024**3
+
+    def test_upload_with_signed_part_urls(self):
+        upload_id = s3.create_signed_multipart_upload("bucket", "big", "application/zip")
+        urls = s3.get_signed_part_urls("bucket", "big", upload_id, range(1, 4))
+        assert sorted(urls) == [1, 2, 3]
+        assert len(set(urls.values())) == 3
+
+        # The client uploads the parts (here, out of order) and resumes after a failure
+        self.s3.upload_part(Bucket="bucket", Key="big", UploadId=upload_id, PartNumber=2, Body=b"b")
+        self.s3.upload_part(Bucket="bucket", Key="big", UploadId=upload_id, PartNumber=1, Body=b"a")
+        uploaded = s3.list_uploaded_parts("bucket", "big", upload_id)
+        assert [part["PartNumber"] for part in uploaded] == [1, 2]
+        self.s3.upload_part(Bucket="bucket", Key="big", UploadId=upload_id, PartNumber=3, Body=b"c")
+
+        parts = [{"PartNumber": n, "ETag": f'"etag-{n}"'} for n in (3, 1, 2)]
+        assert s3.complete_signed_multipart_upload("bucket", "big", upload_id, parts)
+        assert self.s3.objects[("bucket", "big")] == b"abc"
+
+    def test_cognito_id_is_optional(self):
+        assert s3.create_signed_multipart_upload("bucket", "big", "application/zip")
+        assert s3.create_signed_multipart_upload("bucket", "big", "application/zip", cognito_id="user-1")
+        assert s3.get_signed_upload_url("bucket", "file", "text/plain")
+
+    def test_part_urls_are_not_cached(self):
+        s3.signed_url_cache.clear()
+        upload_id = s3.create_signed_multipart_upload("bucket", "big", "application/zip")
+        s3.get_signed_part_urls("bucket", "big", upload_id, range(1, 101))
+        assert s3.signed_url_cache.stats()["entries"] == 0
+
+    def test_rejects_invalid_parts(self):
+        upload_id = s3.create_signed_multipart_upload("bucket", "big", "application/zip")
+        with pytest.raises(ValueError):
+            s3.get_signed_part_urls("bucket", "big", upload_id, [0])
+        parts = [{"PartNumber": 1, "ETag": '"a"'}, {"PartNumber": 1, "ETag": '"b"'}]
+        assert not s3.complete_signed_multipart_upload("bucket", "big", upload_id, parts)
+
+    def test_abort_stale_uploads(self):
+        stale = s3.create_signed_multipart_upload("bucket", "uploads/stale", "application/zip")
+        fresh = s3.create_signed_multipart_upload("bucket", "uploads/fresh", "application/zip")
+        key, initiated = self.s3.upload_keys[stale]
+        self.s3.upload_keys[stale] = (key, initiated - datetime.timedelta(days=2))
+
+        assert s3.abort_stale_multipart_uploads("bucket", prefix="uploads/") == 1
+        assert self.s3.aborted == [stale]
+        assert fresh in self.s3.uploads
@@ -0,0 +1,97 @@
+"""
+Tests for the Secrets Manager cache, with a fake fetch function
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.secrets_cache import SecretsCache
+
+
+class FakeSecrets:
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.calls = 0
+        self.fail = False
+        self._lock = threading.Lock()
+
+    def __call__(self, secret_name, region_name):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("throttled")
+        return f"{secret_name}-{calls}"
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+class TestSecretsCache:
+    def test_caches_within_ttl(self):
+        fetch = FakeSecrets()
+        cache = SecretsCache(ttl=60, stale_ttl=60, fetch=fetch)
+        assert cache.get("db", "us-east-1") == "db-1"
+        assert cache.get("db", "us-east-1") == "db-1"
+        assert cache.get("db", "eu-west-1") == "db-2"
+        assert cache.stats()["hits"] == 1
+
+    def test_concurrent_misses_fetch_once(self):
+        fetch = FakeSecrets(delay=0.05)
+        cache = SecretsCache(ttl=60, stale_ttl=60, fetch=fetch)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            values = list(executor.map(lambda _: cache.get("db", "us-east-1"), range(16)))
+        assert set(values) == {"db-1"}
+        assert fetch.calls == 1
+
+    def test_stale_value_is_served_while_refreshing(self):
+        fetch = FakeSecrets(delay=0.05)
+        cache = SecretsCache(ttl=0, stale_ttl=60, fetch=fetch)
+        assert cache.get("db", "us-east-1") == "db-1"
+        assert cache.get("db", "us-east-1") == "db-1"
+        assert cache.get("db", "us-east-1") == "db-1"
+        wait_for(lambda: cache.refreshes == 1)
+        assert fetch.calls == 2
+        assert cache.get("db", "us-east-1") == "db-2"
+
+    def test_failed_refresh_keeps_stale_value(self):
+        fetch = FakeSecrets()
+        cache = SecretsCache(ttl=0, stale_ttl=60, fetch=fetch)
+        cache.get("db", "us-east-1")
+        fetch.fail = True
+        assert cache.get("db", "us-east-1") == "db-1"
+        wait_for(lambda: cache.refresh_errors == 1)
+        assert cache.get("db", "us-east-1") == "db-1"
+
+    def test_expired_value_is_fetched_synchronously(self):
+        fetch = FakeSecrets()
+        cache = SecretsCache(ttl=0, stale_ttl=0, fetch=fetch)
+        cache.get("db", "us-east-1")
+        fetch.fail = True
+        with pytest.raises(RuntimeError):
+            cache.get("db", "us-east-1")
+
+    def test_preload(self):
+        fetch = FakeSecrets()
+        cache = SecretsCache(ttl=60, stale_ttl=60, fetch=fetch)
+        assert cache.preload(["db", "api"], "us-east-1") == 2
+        cache.get("db", "us-east-1")
+        assert fetch.calls == 2
+
+        fetch.fail = True
+        assert cache.preload(["other"], "us-east-1") == 0
+
+    def test_invalidate(self):
+        fetch = FakeSecrets()
+        cache = SecretsCache(ttl=60, stale_ttl=60, fetch=fetch)
+        cache.get("db", "us-east-1")
+        cache.invalidate("db")
+        assert cache.get("db", "us-east-1") == "db-2"
@@ -0,0 +1,110 @@
+"""
+Tests for single-flight coalescing of concurrent calls
+"""
+
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_are_coalesced(self):
+        single_flight = SingleFlight()
+        executions = []
+
+        async def fetch():
+            executions.append(1)
+            await asyncio.sleep(0.01)
+            return {"value": len(executions)}
+
+        async def main():
+            return await asyncio.gather(*(single_flight.do("key", fetch) for _ in range(5)))
+
+        results = asyncio.run(main())
+        assert executions == [1]
+        assert results == [{"value": 1}] * 5
+        assert single_flight.stats() == {"in_flight": 0, "calls": 1, "coalesced": 4}
+
+    def test_exceptions_are_shared(self):
+        single_flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream failed")
+
+        async def main():
+            return await asyncio.gather(*(single_flight.do("key", fetch) for _ in range(3)), return_exceptions=True)
+
+        results = asyncio.run(main())
+        assert all(isinstance(result, ValueError) for result in results)
+
+    def test_leader_cancellation_does_not_cancel_followers(self):
+        single_flight = SingleFlight()
+        cancelled = []
+
+        async def fetch():
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+            return "done"
+
+        async def main():
+            leader = asyncio.ensure_future(single_flight.do("key", fetch))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(single_flight.do("key", fetch))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        assert asyncio.run(main()) == "done"
+        assert cancelled == []
+
+    def test_call_cancelled_when_all_callers_leave(self):
+        single_flight = SingleFlight()
+        cancelled = []
+
+        async def fetch():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        async def main():
+            callers = [asyncio.ensure_future(single_flight.do("key", fetch)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            for caller in callers:
+                caller.cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            await asyncio.sleep(0)
+
+        asyncio.run(main())
+        assert cancelled == [1]
+        assert single_flight.in_flight() == 0
+
+    def test_caller_after_cancellation_starts_a_fresh_call(self):
+        single_flight = SingleFlight()
+        executions = []
+
+        async def fetch():
+            executions.append(1)
+            await asyncio.sleep(0.01)
+            return len(executions)
+
+        async def main():
+            caller = asyncio.ensure_future(single_flight.do("key", fetch))
+            await asyncio.sleep(0)
+            caller.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await caller
+            # The cancelled call's done callback hasn't run yet
+            return await single_flight.do("key", fetch)
+
+        assert asyncio.run(main()) == 2
+        assert single_flight.in_flight() == 0
@@ -0,0 +1,60 @@
+"""
+Tests for the warmup ping short-circuit in the Lambda handler
+"""
+
+import asyncio
+
+import pytest
+
+import app
+from utils import aws, warmup
+
+WARMUP_EVENT = {"source": "serverless-plugin-warmup"}
+
+
+class TestWarmup:
+    @pytest.fixture(autouse=True)
+    def setup(self, monkeypatch):
+        monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+        aws.reset_clients()
+        self.database_primed = 0
+        self.upstream_primed = 0
+
+        # These would need a live database and upstream
+        async def prime_database():
+            self.database_primed += 1
+
+        async def prime_upstream():
+            self.upstream_primed += 1
+
+        monkeypatch.setattr(warmup, "prime_database", prime_database)
+        monkeypatch.setattr(warmup, "prime_upstream", prime_upstream)
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        yield
+        asyncio.get_event_loop().close()
+        aws.reset_clients()
+
+    def test_is_warmup_event(self):
+        assert warmup.is_warmup_event(WARMUP_EVENT)
+        assert not warmup.is_warmup_event({"requestContext": {}})
+        assert not warmup.is_warmup_event(None)
+
+    def test_lambda_handler_primes_connections(self, monkeypatch):
+        monkeypatch.setattr(app, "handler", lambda event, context: pytest.fail("warmup went through Mangum"))
+        response = app.lambda_handler(WARMUP_EVENT, None)
+
+        assert response["statusCode"] == 200
+        assert set(response["primed"]) == {"database", "upstream", "aws"}
+        assert all(result.endswith(" ms") for result in response["primed"].values())
+        assert self.database_primed == 1
+        assert self.upstream_primed == 1
+        assert {key[1:] for key in aws._clients} == {("s3", None), ("secretsmanager", "us-east-1")}
+
+    def test_failures_are_reported(self, monkeypatch):
+        async def fail():
+            raise ConnectionError("unreachable")
+
+        monkeypatch.setattr(warmup, "prime_database", fail)
+        primed = warmup.handle_warmup_event()["primed"]
+        assert primed["database"] == "failed: unreachable"
+        assert primed["upstream"].endswith(" ms")
@@ -1,7 +1,6 @@
-import boto3
-from botocore.exceptions import ClientError
 import datetime
-from config import settings
+
+from utils.secrets_cache import fetch_secret, secrets_cache
 
 
 def get_utc_now():
@@ -13,22 +12,14 @@ def get_utc_now():
     return datetime.datetime.utcnow()
 
 
-def get_secret(secret_name, region_name="us-east-1"):
-    # Create a Secrets Manager client
-    boto_session = boto3.session.Session(profile_name=settings.AWS_PROFILE)
-    client = boto_session.client(service_name="secretsmanager", region_name=region_name)
-
-    try:
-        get_secret_value_response = client.get_secret_value(SecretId=secret_name)
-    except ClientError as e:
-        # For a list of exceptions thrown, see
-        # https://docs.aws.amazon.com/secretsmanager/latest/apireference/API_GetSecretValue.html
-        raise e
-
-    # Decrypts secret using the associated KMS key.
-    secret = get_secret_value_response["SecretString"]
-
-    return secret
+def get_secret(secret_name, region_name="us-east-1", use_cache=True):
+    """
+    Returns a secret's value, from the in-process cache unless `use_cache` is False. Cached values are refreshed in
+    the background once they are older than SECRETS_CACHE_TTL.
+    """
+    if not use_cache:
+        return fetch_secret(secret_name, region_name)
+    return secrets_cache.get(secret_name, region_name)
 
 
 def format_file_size(size_in_bytes):
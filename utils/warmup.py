@@ -0,0 +1,73 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict
+
+from sqlalchemy import text
+
+from config import settings
+from database import async_session_scope
+from utils.aws import get_client
+from utils.http_client import get_http_client
+from utils.logger import logger
+
+WARMUP_SOURCE = "serverless-plugin-warmup"
+
+
+def is_warmup_event(event) -> bool:
+    return isinstance(event, dict) and event.get("source") == WARMUP_SOURCE
+
+
+async def prime_database():
+    # Opens a pooled connection on the async engine, which is what the chat routes use
+    async with async_session_scope() as session:
+        await session.execute(text("SELECT 1"))
+
+
+async def prime_upstream():
+    # Any response will do: the point is the TCP and TLS handshakes, after which the connection stays in the pool
+    client = get_http_client()
+    await client.head(settings.API_URL, headers={"Connection": "keep-alive"})
+
+
+async def prime_aws_clients():
+    # Building a boto3 client loads its service model, which is the slow part. Entries are "service" or
+    # "service:region", matching how the helpers ask for their clients.
+    clients = [entry.partition(":")[::2] for entry in settings.WARMUP_AWS_CLIENTS]
+    await asyncio.gather(
+        *(asyncio.to_thread(get_client, service, region_name=region or None) for service, region in clients)
+    )
+
+
+async def prime_connections() -> Dict[str, str]:
+    """
+    Opens the connections a request is going to need, concurrently. Failures are reported rather than raised, since
+    a warmup ping has nobody to return them to. Returns how long each step took, or its error.
+    """
+    steps: Dict[str, Callable[[], Awaitable]] = {}
+    if settings.WARMUP_PRIME_DATABASE:
+        steps["database"] = prime_database
+    if settings.WARMUP_PRIME_UPSTREAM:
+        steps["upstream"] = prime_upstream
+    if settings.WARMUP_AWS_CLIENTS:
+        steps["aws"] = prime_aws_clients
+
+    async def timed(step: Callable[[], Awaitable]) -> str:
+        started = time.perf_counter()
+        try:
+            await step()
+        except Exception as e:
+            return f"failed: {str(e)}"
+        return f"{(time.perf_counter() - started) * 1000:.0f} ms"
+
+    results = await asyncio.gather(*(timed(step) for step in steps.values()))
+    return dict(zip(steps, results))
+
+
+def handle_warmup_event() -> dict:
+    """
+    Primes connections on the event loop Mangum runs requests on, so that the next request finds them in the pools
+    """
+    loop = asyncio.get_event_loop()
+    primed = loop.run_until_complete(prime_connections())
+    logger.info("Warmup event handled, primed: %s", primed)
+    return {"statusCode": 200, "body": "warm", "primed": primed}